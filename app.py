@@ -1,8 +1,15 @@
 import os
+import base64
+import hashlib
 import logging
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
+import threading
+from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, session, make_response
 from werkzeug.middleware.proxy_fix import ProxyFix
 from scraper import CompetitorScraper
+from jobs import RefreshJobQueue
+from metrics import CIRCUIT_STATE, HOST_TIMEOUT, HTTP_POOL, REGISTRY
+from events import ChangeFeed, FeedFull, fingerprint
+from exports import csv_chunks, encoded, gzipped, ndjson_chunks
 import json
 from datetime import datetime, timezone
 import dateutil.parser
@@ -18,6 +25,105 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 # Initialize the scraper
 scraper = CompetitorScraper()
 
+# Refreshes run in the background so requests never wait on the network
+refresh_jobs = RefreshJobQueue(scraper)
+
+
+class VersionedResponseCache:
+    """Caches rendered bodies until the scraper's data version changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        """Return (body, etag) for key, building the body only when version changed"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                return entry[1], entry[2]
+        body = build()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        # Hash of the content, so every worker hands out the same strong ETag
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._entries[key] = (version, body, etag)
+        return body, etag
+
+
+response_cache = VersionedResponseCache()
+
+
+def render_dashboard():
+    """Render the dashboard from one published version of the data"""
+    # Nothing process-specific goes into the page, so every worker serves the
+    # same ETag; the fingerprint depends only on the data
+    current = scraper.store.current()
+    return render_template('index.html', data=current.snapshots, data_fingerprint=fingerprint(current.snapshots))
+
+
+def render_cards(snapshots, keys):
+    """Cards of the given competitors and the dashboard totals, for live updates"""
+    # Rendered outside any request, so url_for needs one to build paths
+    with app.test_request_context():
+        cards = {
+            key: render_template('_competitor_card.html', competitor_id=key, competitor_data=snapshots[key])
+            for key in keys
+        }
+    success = sum(1 for snapshot in snapshots.values() if snapshot.success)
+    return {
+        'cards': cards,
+        'stats': {'total': len(snapshots), 'success': success, 'failed': len(snapshots) - success},
+    }
+
+
+# Pushes changed cards to open dashboards; one render per change, shared by all
+# viewers. Each open stream holds a worker thread (gunicorn.conf.py), so only a
+# few are served at once and further dashboards poll their refresh jobs instead.
+change_feed = ChangeFeed(
+    scraper.store, render_cards,
+    max_subscribers=int(os.environ.get('PRICESCRAPE_STREAM_SUBSCRIBERS', '8')),
+)
+
+# Seconds a dashboard turned away from /api/stream waits before trying again
+STREAM_RETRY_AFTER = 60
+
+
+def cached_response(key, build, mimetype, headers=None):
+    """Serve a body from the version cache, answering If-None-Match with 304"""
+    body, etag = response_cache.get(key, scraper.data_version, build)
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(etag)
+    # Let clients keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    if headers:
+        response.headers.update(headers)
+    return response.make_conditional(request)
+
+
+def data_json():
+    """Serialize the latest data of every competitor"""
+    data = {key: snapshot.to_dict() for key, snapshot in scraper.get_all_data().items()}
+    return app.json.dumps(data) + "\n"
+
+
+def wants_json():
+    """Whether the client prefers a JSON response over an HTML redirect"""
+    return request.accept_mimetypes.best == 'application/json'
+
+
+def job_started_response(job_id, message):
+    """Respond to a refresh submission with the job id"""
+    if wants_json():
+        return jsonify({
+            'job_id': job_id,
+            'status_url': url_for('api_job', job_id=job_id),
+        }), 202
+    flash(message, "info")
+    return redirect(url_for('index'))
+
 # Custom template filters
 @app.template_filter('from_iso')
 def from_iso_filter(date_string):
@@ -62,8 +168,10 @@ def timesince_filter(dt):
 def index():
     """Main dashboard showing competitor pricing data"""
     try:
-        data = scraper.get_all_data()
-        return render_template('index.html', data=data)
+        # Pages with flash messages are one-off; everything else is cached per data version
+        if session.get('_flashes'):
+            return render_dashboard()
+        return cached_response('index', render_dashboard, 'text/html')
     except Exception as e:
         logging.error(f"Error loading dashboard: {str(e)}")
         flash(f"Error loading data: {str(e)}", "error")
@@ -71,68 +179,272 @@ def index():
 
 @app.route('/refresh', methods=['POST'])
 def refresh_data():
-    """Manually trigger a refresh of all competitor data"""
+    """Queue a background refresh of all competitor data"""
     try:
-        logging.info("Starting manual refresh of competitor data")
-        results = scraper.scrape_all()
-        
-        success_count = sum(1 for result in results.values() if result.get('success'))
-        total_count = len(results)
-        
-        if success_count == total_count:
-            flash(f"Successfully updated all {success_count} competitors", "success")
-        elif success_count > 0:
-            flash(f"Updated {success_count} out of {total_count} competitors. Check logs for errors.", "warning")
-        else:
-            flash("Failed to update any competitor data. Check logs for errors.", "error")
-            
-        logging.info(f"Refresh completed: {success_count}/{total_count} successful")
-        
+        logging.info("Queueing manual refresh of competitor data")
+        job_id = refresh_jobs.submit()
     except Exception as e:
-        logging.error(f"Error during refresh: {str(e)}")
+        logging.error(f"Error queueing refresh: {str(e)}")
+        if wants_json():
+            return jsonify({'error': str(e)}), 500
         flash(f"Error during refresh: {str(e)}", "error")
+        return redirect(url_for('index'))
     
-    return redirect(url_for('index'))
+    return job_started_response(job_id, "Refresh started. Data will update as each competitor finishes.")
 
 @app.route('/refresh/<competitor>')
 def refresh_single(competitor):
-    """Refresh data for a single competitor"""
+    """Queue a background refresh for a single competitor"""
+    if competitor not in scraper.competitors:
+        if wants_json():
+            return jsonify({'error': f'Unknown competitor: {competitor}'}), 404
+        flash(f"Failed to update {competitor}: Unknown competitor", "error")
+        return redirect(url_for('index'))
+    
     try:
-        result = scraper.scrape_single(competitor)
-        if result.get('success'):
-            flash(f"Successfully updated {competitor}", "success")
-        else:
-            flash(f"Failed to update {competitor}: {result.get('error', 'Unknown error')}", "error")
+        job_id = refresh_jobs.submit([competitor])
     except Exception as e:
         logging.error(f"Error refreshing {competitor}: {str(e)}")
+        if wants_json():
+            return jsonify({'error': str(e)}), 500
         flash(f"Error refreshing {competitor}: {str(e)}", "error")
+        return redirect(url_for('index'))
     
-    return redirect(url_for('index'))
+    return job_started_response(job_id, f"Refresh of {competitor} started.")
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """API endpoint to get the progress of a refresh job"""
+    job = refresh_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job)
+
+# Streamed export formats: serializer and content type
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+    'csv': (csv_chunks, 'text/csv'),
+}
+
+# Query options only the streamed formats support
+STREAMED_EXPORT_OPTIONS = ('scope', 'competitor', 'since', 'until', 'gzip')
+
+
+def export_records(scope):
+    """Snapshots to export as entry dicts with their competitor, produced lazily"""
+    competitor_key = request.args.get('competitor')
+    if scope == 'history':
+        return scraper.store.iter_snapshots(
+            competitor_key,
+            parse_time(request.args.get('since')),
+            parse_time(request.args.get('until')),
+        )
+    if scope != 'latest':
+        raise ValueError(f"Unsupported scope: {scope}")
+    latest = scraper.get_all_data()
+    return (
+        {'competitor': key, **snapshot.to_dict()}
+        for key, snapshot in latest.items()
+        if competitor_key is None or key == competitor_key
+    )
+
 
 @app.route('/export')
 def export_data():
-    """Export all competitor data as JSON"""
+    """Export competitor data
+
+    By default the latest data is one JSON document. ?format=ndjson (one
+    snapshot per line) and ?format=csv (one row per plan) are streamed as
+    they are produced, so memory stays flat however much is exported; they
+    cover the latest data, or with ?scope=history every stored snapshot,
+    optionally filtered by ?competitor=, ?since= and ?until=. ?gzip=1
+    compresses the stream on the fly. The JSON document takes none of
+    these options and is refused (400) rather than ignoring them.
+    """
     try:
-        data = scraper.get_all_data()
-        return jsonify(data), 200, {
-            'Content-Type': 'application/json',
-            'Content-Disposition': f'attachment; filename=competitor_pricing_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-        }
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        export_format = request.args.get('format', 'json')
+        if export_format == 'json':
+            options = [name for name in STREAMED_EXPORT_OPTIONS if name in request.args]
+            if request.args.get('scope', 'latest') == 'latest' and 'scope' in options:
+                options.remove('scope')
+            if options:
+                raise ValueError(f"{', '.join(options)} need format=ndjson or format=csv")
+            return cached_response('data_json', data_json, 'application/json', {
+                'Content-Disposition': f'attachment; filename=competitor_pricing_{stamp}.json'
+            })
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported format: {export_format}")
+
+        serialize, mimetype = EXPORT_FORMATS[export_format]
+        scope = request.args.get('scope', 'latest')
+        chunks = serialize(export_records(scope))
+        filename = f'competitor_pricing_{scope}_{stamp}.{export_format}'
+        if request.args.get('gzip') in ('1', 'true'):
+            body, mimetype, filename = gzipped(chunks), 'application/gzip', filename + '.gz'
+        else:
+            body = encoded(chunks)
+        return app.response_class(body, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Cache-Control': 'no-store',
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error exporting data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/stream')
+def api_stream():
+    """Server-sent events carrying the cards of competitors whose data changed
+
+    Each 'update' event has the rendered cards of the changed competitors
+    and the dashboard totals. A client whose Last-Event-ID (or, on its
+    first connection, ?since= with the fingerprint of the page it loaded)
+    is not the data we hold first gets every card. Streams close after a
+    few minutes and the browser reconnects. When too many dashboards are
+    subscribed the answer is 503, and the page polls its refresh jobs.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        subscriber = change_feed.subscribe()
+    except FeedFull as e:
+        logging.info(f"Turning away a dashboard stream: {str(e)}")
+        response = make_response(f"retry: {STREAM_RETRY_AFTER * 1000}\n\n", 503)
+        response.mimetype = 'text/event-stream'
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+        return response
+    response = app.response_class(change_feed.stream(subscriber, last_event_id), mimetype='text/event-stream')
+    # Also when the stream is closed before its first event
+    response.call_on_close(lambda: change_feed.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/data')
 def api_data():
     """API endpoint to get all data"""
     try:
-        data = scraper.get_all_data()
-        return jsonify(data)
+        return cached_response('data_json', data_json, 'application/json')
     except Exception as e:
         logging.error(f"Error getting API data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/plans')
+def api_plans():
+    """API endpoint to query normalized plans across competitors
+
+    ?view=cheapest returns the cheapest plan per tier, compared in
+    ?currency= (EUR by default). Otherwise plans are listed, optionally
+    filtered by competitor, tier, currency or max_monthly_eur.
+    """
+    try:
+        table = scraper.get_plan_table()
+        if request.args.get('view') == 'cheapest':
+            currency = request.args.get('currency', 'EUR').upper()
+            return jsonify(table.cheapest_per_tier(currency))
+        
+        max_monthly_eur = request.args.get('max_monthly_eur', type=float)
+        rows = table.select(
+            competitor=request.args.get('competitor'),
+            tier=request.args.get('tier'),
+            currency=request.args.get('currency'),
+            max_monthly_eur=max_monthly_eur,
+        )
+        return jsonify(table.rows(rows))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error getting plan data: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def parse_time(value):
+    """Parse an ISO 8601 query parameter into a naive local datetime, as stored"""
+    if not value:
+        return None
+    try:
+        parsed = dateutil.parser.isoparse(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def encode_cursor(last):
+    timestamp, row_id = last
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+@app.route('/api/history')
+def api_history():
+    """API endpoint for pricing over time
+
+    Filters: ?competitor=, ?plan= (plan name or tier), ?since= and ?until=
+    (ISO 8601). Long ranges are downsampled to each competitor's last
+    snapshot per day unless ?interval=raw. Up to ?limit= items (100 by
+    default, at most 1000) are returned per page; pass next_cursor back as
+    ?cursor= for the next one. With ?plan= a page can hold fewer items
+    and still have a next_cursor; only a null next_cursor ends the history.
+    """
+    try:
+        interval = request.args.get('interval', 'day')
+        if interval not in ('day', 'raw'):
+            raise ValueError(f"Unsupported interval: {interval}")
+        limit = request.args.get('limit', 100, type=int)
+        if not 1 <= limit <= 1000:
+            raise ValueError("limit must be between 1 and 1000")
+        cursor = request.args.get('cursor')
+        items, last = scraper.get_history(
+            competitor_key=request.args.get('competitor'),
+            plan=request.args.get('plan'),
+            since=parse_time(request.args.get('since')),
+            until=parse_time(request.args.get('until')),
+            interval=None if interval == 'raw' else interval,
+            after=decode_cursor(cursor) if cursor else None,
+            limit=limit,
+        )
+        return jsonify({
+            'interval': interval,
+            'items': items,
+            'next_cursor': encode_cursor(last) if last else None,
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error getting history: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Scrape metrics in the Prometheus text format
+
+    Counters are kept per process; with several gunicorn workers each
+    worker reports its own.
+    """
+    for counter, value in scraper.connection_stats().items():
+        HTTP_POOL.labels(counter).set(value)
+    CIRCUIT_STATE.clear()
+    for host, state in scraper.http.breaker.states().items():
+        if state != 'closed':
+            CIRCUIT_STATE.labels(host).set(1 if state == 'open' else 0.5)
+    for host, timeout in scraper.http.latency.timeouts().items():
+        HOST_TIMEOUT.labels(host).set(timeout)
+    response = make_response(REGISTRY.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
 # New clear_data route inserted after /api/data and before error handlers
 @app.route('/clear_data', methods=['POST'])
 def clear_data():
@@ -0,0 +1,149 @@
+import gzip
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+from storage import DATA_DIR
+
+
+def read_object(path):
+    """Decompressed contents of an archive object file"""
+    with gzip.open(path, 'rb') as f:
+        return f.read()
+
+
+class PageWriter:
+    """Compresses a body to a temporary file while it is being read.
+
+    Write errors (e.g. a full disk) are logged once and the page is then
+    simply not archived; they never fail the scrape.
+    """
+
+    def __init__(self, path, compresslevel):
+        self.path = path
+        self.failed = False
+        try:
+            self._file = gzip.open(path, 'wb', compresslevel=compresslevel)
+        except OSError as e:
+            self._fail(e)
+
+    def write(self, chunk):
+        if self.failed:
+            return
+        try:
+            self._file.write(chunk)
+        except OSError as e:
+            self._fail(e)
+
+    def close(self):
+        """Finish the file; returns whether it was written completely"""
+        if not self.failed:
+            try:
+                self._file.close()
+            except OSError as e:
+                self._fail(e)
+        return not self.failed
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _fail(self, error):
+        logging.warning(f"Could not archive page to {self.path}: {str(error)}")
+        self.failed = True
+        file = getattr(self, '_file', None)
+        if file is not None:
+            try:
+                file.close()
+            except OSError:
+                pass
+
+
+class PageArchive:
+    """Content-addressed archive of raw fetched pages.
+
+    Every body is stored once, gzip-compressed, under its sha256 in
+    objects/<first two hex digits>/<digest>.gz, so fetching an unchanged
+    page again costs no space. The store indexes which competitor served
+    which body and when, one row per run of identical fetches. Bodies are
+    read back as streams.
+
+    Versions not seen for max_age seconds are pruned, except each
+    competitor's newest keep_versions, and bodies no longer referenced
+    are deleted.
+    """
+
+    def __init__(self, store, directory=None, max_age=180 * 86400, keep_versions=5, compresslevel=6):
+        self.store = store
+        self.directory = directory or os.path.join(DATA_DIR, "archive")
+        self.max_age = max_age
+        self.keep_versions = keep_versions
+        self.compresslevel = compresslevel
+        os.makedirs(os.path.join(self.directory, "tmp"), exist_ok=True)
+
+    def writer(self):
+        """PageWriter to pass to read_body as its sink"""
+        return PageWriter(os.path.join(self.directory, "tmp", uuid.uuid4().hex), self.compresslevel)
+
+    def add(self, competitor_key, url, writer, digest, size, encoding=None, seen=None):
+        """Keep a body written through writer under its digest and index it"""
+        if not writer.close():
+            writer.discard()
+            return False
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            # Seen before; the stored copy is identical
+            writer.discard()
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(writer.path, path)
+        self.store.record_page(competitor_key, url, digest, size, encoding, seen or datetime.now())
+        return True
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.gz")
+
+    def open(self, digest):
+        """Binary file object streaming the decompressed body"""
+        return gzip.open(self.path_for(digest), 'rb')
+
+    def read(self, digest):
+        """The whole body as bytes"""
+        return read_object(self.path_for(digest))
+
+    def copy_to(self, digest, destination, chunk_size=65536):
+        """Stream the body into a writable binary file object"""
+        with self.open(digest) as f:
+            shutil.copyfileobj(f, destination, chunk_size)
+
+    def versions(self, competitor_key=None, since=None, until=None):
+        """Indexed page versions, by competitor and then oldest first"""
+        return self.store.archived_pages(competitor_key, since, until)
+
+    def prune(self):
+        """Apply the retention policy; returns the number of bodies deleted"""
+        orphans = self.store.prune_archived_pages(self.max_age, self.keep_versions)
+        for digest in orphans:
+            try:
+                os.remove(self.path_for(digest))
+            except FileNotFoundError:
+                pass
+        if orphans:
+            logging.info(f"Pruned {len(orphans)} archived pages")
+
+        # Leftovers of writers that never finished (e.g. a killed worker)
+        tmp = os.path.join(self.directory, "tmp")
+        stale = time.time() - 86400
+        for entry in os.scandir(tmp):
+            if entry.stat().st_mtime < stale:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return len(orphans)
@@ -0,0 +1,132 @@
+"""Re-extract pricing data from archived pages, without crawling.
+
+Runs the current extractors over the archived page behind every stored
+snapshot and writes the results back into the pricing history. Only
+pages last extracted by another extractor version are processed, unless
+--all is given; pages are parsed in parallel worker processes.
+
+The pricing data a backfill replaces is kept, and --revert puts it back
+for the snapshots the current extractors rewrote.
+
+    python backfill.py                      # every competitor, all cores
+    python backfill.py --competitor bolago --workers 2
+    python backfill.py --dry-run            # only count what would be redone
+    python backfill.py --revert --competitor bolago
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from archive import PageArchive, read_object
+from extraction import extract_page, process_context
+from extractors import extractor_version
+from registry import CompetitorRegistry
+from storage import PricingStore
+
+
+def reextract(path, extractor_ref, encoding):
+    """Extract pricing data from one archived page; runs in a worker process"""
+    pricing_data, info = extract_page(extractor_ref, read_object(path), encoding)
+    return pricing_data
+
+
+def pending_pages(store, archive, registry, competitor_keys, everything=False):
+    """(competitor_key, digest, path, extractor_ref, encoding, version) of every page to re-extract"""
+    pages = []
+    for key in competitor_keys:
+        competitor = registry[key]
+        version = extractor_version(competitor['extractor'])
+        digests = store.sources(key) if everything else store.stale_sources(key, version)
+        if not digests:
+            continue
+        # Decode as the live scrape did: registry charset, else the one sniffed then
+        encodings = {row['digest']: row['encoding'] for row in archive.versions(key)}
+        for digest in digests:
+            encoding = competitor.get('encoding') or encodings.get(digest)
+            pages.append((key, digest, archive.path_for(digest), competitor['extractor'], encoding, version))
+    return pages
+
+
+def run(store, archive, registry, competitor_keys, workers, everything=False, dry_run=False):
+    """Re-extract pending pages; returns counts of pages and snapshots updated"""
+    pages = pending_pages(store, archive, registry, competitor_keys, everything)
+    counts = {'pages': len(pages), 'reextracted': 0, 'missing': 0, 'failed': 0, 'snapshots': 0}
+    logging.info(f"{len(pages)} archived pages to re-extract")
+    if dry_run or not pages:
+        return counts
+
+    def finish(page, pricing_data):
+        key, digest, path, extractor_ref, encoding, version = page
+        counts['reextracted'] += 1
+        counts['snapshots'] += store.update_extraction(key, digest, pricing_data, version)
+
+    def failed(page, error):
+        if isinstance(error, FileNotFoundError):
+            # Pruned from the archive since the snapshot was stored
+            counts['missing'] += 1
+            logging.warning(f"Archived page {page[1]} of {page[0]} is gone; skipping")
+        else:
+            counts['failed'] += 1
+            logging.error(f"Re-extracting page {page[1]} of {page[0]} failed: {str(error)}")
+
+    if workers <= 1:
+        for page in pages:
+            try:
+                finish(page, reextract(*page[2:5]))
+            except Exception as e:
+                failed(page, e)
+        return counts
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as pool:
+        futures = {pool.submit(reextract, *page[2:5]): page for page in pages}
+        # Results are written by this process as they come in
+        for future in as_completed(futures):
+            page = futures[future]
+            try:
+                finish(page, future.result())
+            except Exception as e:
+                failed(page, e)
+    return counts
+
+
+def revert(store, registry, competitor_keys):
+    """Undo the backfills of the current extractors; returns the number of snapshots restored"""
+    restored = 0
+    for key in competitor_keys:
+        restored += store.revert_extraction(key, extractor_version(registry[key]['extractor']))
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--competitor", action="append", help="competitor key; repeat for several (default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (1 runs inline)")
+    parser.add_argument("--all", action="store_true", help="re-extract every page, not just outdated ones")
+    parser.add_argument("--dry-run", action="store_true", help="only count the pages to re-extract")
+    parser.add_argument("--revert", action="store_true", help="restore the pricing data the current extractors replaced")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    registry = CompetitorRegistry()
+    competitor_keys = args.competitor or list(registry)
+    unknown = [key for key in competitor_keys if key not in registry]
+    if unknown:
+        parser.error(f"Unknown competitor: {', '.join(unknown)}")
+
+    store = PricingStore()
+    if args.revert:
+        logging.info(f"Restored the previous pricing data of {revert(store, registry, competitor_keys)} snapshots")
+        return
+    started = time.perf_counter()
+    counts = run(store, PageArchive(store), registry, competitor_keys, args.workers, args.all, args.dry_run)
+    logging.info(
+        f"Re-extracted {counts['reextracted']}/{counts['pages']} pages, updating {counts['snapshots']} snapshots "
+        f"({counts['missing']} missing, {counts['failed']} failed) in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
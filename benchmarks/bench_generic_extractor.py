@@ -0,0 +1,116 @@
+"""Benchmark the generic pricing extractor on large synthetic pages.
+
+Prints one JSON object per page size with the time per byte of the
+current streaming extractor and of the previous implementation, so a
+flat ns/byte column shows the scan stays linear.
+
+    python benchmarks/bench_generic_extractor.py [--sizes 10000,100000,1000000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import GenericExtractor  # noqa: E402
+
+WORDS = (
+    "our product provides project tools for teams professional services "
+    "integrations reporting dashboards security compliance onboarding support "
+    "analytics workflow automation customers trusted worldwide"
+).split()
+
+PRICING_LINES = [
+    "Basic",
+    "Starter plan",
+    "Pro",
+    "Enterprise - contact sales",
+    "$49 per month",
+    "€990/year",
+    "Free forever for small teams",
+    "Custom pricing for large organisations",
+]
+
+
+def make_page(size, seed=0):
+    """Marketing-style text of roughly size characters with a pricing block in the middle"""
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    pricing_at = size // 2
+    while length < size:
+        if pricing_at is not None and length >= pricing_at:
+            lines.extend(PRICING_LINES)
+            length += sum(len(line) + 1 for line in PRICING_LINES)
+            pricing_at = None
+            continue
+        line = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 30)))
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)
+
+
+def legacy_extract(text_content):
+    """The extractor as it was before the streaming rewrite, for comparison"""
+    price_patterns = [
+        r'[\$£€]\d+(?:,\d{3})*(?:\.\d{2})?',
+        r'\d+(?:,\d{3})*(?:\.\d{2})?\s*(?:per|/)\s*(?:month|year|user)',
+        r'(?:free|gratis|kostenlos)',
+        r'(?:contact|custom|enterprise)',
+    ]
+    pricing_info = []
+    for pattern in price_patterns:
+        pricing_info.extend(re.findall(pattern, text_content, re.IGNORECASE))
+    plan_keywords = ['basic', 'starter', 'pro', 'enterprise', 'premium', 'growth', 'scale', 'free', 'standard']
+    plans = []
+    for line in text_content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        for keyword in plan_keywords:
+            if keyword.lower() in line.lower() and len(line) < 100:
+                plans.append({'name': line})
+                break
+    return {'plans': plans, 'pricing_mentions': pricing_info[:10]}
+
+
+def best_time(func, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000,5000000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-legacy', action='store_true', help="skip the previous implementation")
+    args = parser.parse_args()
+
+    extractor = GenericExtractor()
+    for size in (int(s) for s in args.sizes.split(',')):
+        text = make_page(size)
+        result = {'bytes': len(text.encode('utf-8'))}
+
+        elapsed = best_time(extractor.extract_text, text, args.repeat)
+        result['streaming_s'] = round(elapsed, 6)
+        result['streaming_ns_per_byte'] = round(elapsed * 1e9 / result['bytes'], 2)
+
+        if not args.no_legacy:
+            elapsed = best_time(legacy_extract, text, args.repeat)
+            result['legacy_s'] = round(elapsed, 6)
+            result['legacy_ns_per_byte'] = round(elapsed * 1e9 / result['bytes'], 2)
+
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
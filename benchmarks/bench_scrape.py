@@ -0,0 +1,265 @@
+"""Offline scrape benchmark against recorded fixtures and a local stand-in server.
+
+Serves benchmarks/fixtures/*.html from StandInServer, points every
+competitor at it and reports, as one JSON document:
+
+  * per-stage time (parse, extract) for each fixture, measured offline
+  * wall time of cold and warm (conditional GET) full refreshes
+  * wall time of a single cold refresh per competitor
+  * for both kinds of refresh, the time recorded per scrape stage (the
+    pricescrape_stage_seconds metric), with network and processing subtotals
+  * peak traced memory of a cold full refresh
+
+Stage times are summed over competitors, so in a full refresh, where
+competitors are scraped concurrently, they can add up to more than the
+wall time. The fixtures are small stand-ins; record real pages with
+--record for stage times representative of the live sites.
+
+    python benchmarks/bench_scrape.py --latency 0.2 --rounds 5 --output bench.json
+    python benchmarks/bench_scrape.py --error-rate 0.2 --forbidden-rate 0.1
+    python benchmarks/bench_scrape.py --record   # re-record fixtures from the live sites
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin_server import FIXTURES_DIR, StandInServer  # noqa: E402
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(samples):
+    return {
+        "min_s": round(min(samples), 6),
+        "median_s": round(statistics.median(samples), 6),
+        "max_s": round(max(samples), 6),
+        "samples": len(samples),
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+# Stages of pricescrape_stage_seconds in each subtotal; 'wait' (politeness) is in neither
+NETWORK_STAGES = ("connect", "tls", "response", "download")
+PROCESSING_STAGES = ("parse", "trafilatura", "extract")
+
+
+def stage_seconds():
+    """Seconds recorded so far per scrape stage, summed over competitors"""
+    from metrics import SCRAPE_STAGE_SECONDS
+
+    seconds = {}
+    for (competitor, stage), (count, total) in SCRAPE_STAGE_SECONDS.totals().items():
+        seconds[stage] = seconds.get(stage, 0.0) + total
+    return seconds
+
+
+def timed_stages(func, *args):
+    """Like timed(), also returning the stage seconds recorded while func ran"""
+    before = stage_seconds()
+    elapsed, result = timed(func, *args)
+    after = stage_seconds()
+    return elapsed, result, {stage: after[stage] - before.get(stage, 0.0) for stage in after}
+
+
+def summarize_stages(runs):
+    """Per-stage summaries over runs, plus network and processing subtotals"""
+    report = {
+        stage: summarize([run.get(stage, 0.0) for run in runs])
+        for stage in sorted({stage for run in runs for stage in run})
+    }
+    report["network"] = summarize([sum(run.get(stage, 0.0) for stage in NETWORK_STAGES) for run in runs])
+    report["processing"] = summarize([sum(run.get(stage, 0.0) for stage in PROCESSING_STAGES) for run in runs])
+    return report
+
+
+def reset(scraper):
+    """Forget stored data and cache validators so the next refresh is cold"""
+    scraper.clear_all()
+
+
+def bench_stages(scraper, keys, rounds):
+    """Parse and extract time per fixture, without any network"""
+    from extraction import extract_pricing
+    from parsing import ParsedPage
+
+    stages = {}
+    for key in keys:
+        with open(os.path.join(FIXTURES_DIR, f"{key}.html"), "rb") as f:
+            raw = f.read()
+        parse_samples, extract_samples = [], []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            page = ParsedPage(raw)
+            page.tree
+            page.text
+            parse_samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            extract_pricing(scraper.competitors[key]["extractor"], page, scraper.generic_extractor)
+            extract_samples.append(time.perf_counter() - start)
+        stages[key] = {
+            "bytes": len(raw),
+            "parse": summarize(parse_samples),
+            "extract": summarize(extract_samples),
+        }
+    return stages
+
+
+def record_fixtures(scraper):
+    """Fetch every competitor's live page into the fixtures directory"""
+    for key, competitor in scraper.competitors.items():
+        response = scraper.http.get(competitor["url"], timeout=30)
+        response.raise_for_status()
+        path = os.path.join(FIXTURES_DIR, f"{key}.html")
+        with open(path, "wb") as f:
+            f.write(response.content)
+        print(f"Recorded {key} ({len(response.content)} bytes) to {path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="share of 403 responses")
+    parser.add_argument("--pad-kb", type=int, default=0, help="inline JS padding added to every page")
+    parser.add_argument("--no-etags", action="store_true", help="server sends no ETags")
+    parser.add_argument("--request-delay", type=float, default=0.0, help="politeness delay per host (the scraper uses 2)")
+    parser.add_argument("--parse-workers", type=int, default=0, help="extraction worker processes (0 parses inline)")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--record", action="store_true", help="re-record fixtures from the live sites")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    # Keep benchmark state out of the real data directory
+    data_dir = tempfile.mkdtemp(prefix="pricescrape-bench-")
+    os.environ["PRICESCRAPE_DATA_DIR"] = data_dir
+    os.environ.pop("PRICING_DATABASE_URL", None)
+    os.environ["PRICESCRAPE_PARSE_WORKERS"] = str(args.parse_workers)
+
+    from scraper import CompetitorScraper
+
+    # The scraper prints progress; keep stdout for the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        scraper = CompetitorScraper()
+        if args.record:
+            record_fixtures(scraper)
+            return
+
+        fixtures = {os.path.splitext(name)[0] for name in os.listdir(FIXTURES_DIR) if name.endswith(".html")}
+        keys = [key for key in scraper.competitors if key in fixtures]
+        missing = [key for key in scraper.competitors if key not in fixtures]
+
+        server = StandInServer(
+            host_count=len(keys), latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate, forbidden_rate=args.forbidden_rate,
+            pad_kb=args.pad_kb, etags=not args.no_etags,
+        ).start()
+        for i, key in enumerate(keys):
+            scraper.competitors[key]["url"] = server.url_for(key, i)
+        for key in missing:
+            del scraper.competitors[key]
+        scraper.request_delay = args.request_delay
+
+        try:
+            stages = bench_stages(scraper, keys, args.rounds)
+
+            cold, warm, successes = [], [], []
+            cold_stages, warm_stages = [], []
+            for _ in range(args.rounds):
+                reset(scraper)
+                elapsed, results, run_stages = timed_stages(scraper.scrape_all)
+                cold.append(elapsed)
+                cold_stages.append(run_stages)
+                successes.append(sum(1 for result in results.values() if result.get("success")))
+                elapsed, _, run_stages = timed_stages(scraper.scrape_all)
+                warm.append(elapsed)
+                warm_stages.append(run_stages)
+
+            single = {}
+            for key in keys:
+                samples, single_stages = [], []
+                for _ in range(args.rounds):
+                    reset(scraper)
+                    elapsed, _, run_stages = timed_stages(scraper.scrape_single, key)
+                    samples.append(elapsed)
+                    single_stages.append(run_stages)
+                single[key] = {**summarize(samples), "stages": summarize_stages(single_stages)}
+
+            # Memory is traced in a separate run, since tracing slows everything down
+            reset(scraper)
+            tracemalloc.start()
+            scraper.scrape_all()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            report = {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "config": {
+                    "rounds": args.rounds,
+                    "latency": args.latency,
+                    "jitter": args.jitter,
+                    "error_rate": args.error_rate,
+                    "forbidden_rate": args.forbidden_rate,
+                    "pad_kb": args.pad_kb,
+                    "etags": not args.no_etags,
+                    "request_delay": args.request_delay,
+                    "parse_workers": args.parse_workers,
+                    "hosts": len(server.servers),
+                },
+                "competitors": keys,
+                "missing_fixtures": missing,
+                "stages": stages,
+                "full_refresh": {
+                    "cold": summarize(cold),
+                    "warm": summarize(warm),
+                    "cold_stages": summarize_stages(cold_stages),
+                    "warm_stages": summarize_stages(warm_stages),
+                    "successes": successes,
+                    "peak_memory_bytes": peak,
+                },
+                "single_refresh": single,
+                "connections": scraper.connection_stats(),
+                "server_requests": server.requests,
+            }
+        finally:
+            server.stop()
+            scraper.extraction.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
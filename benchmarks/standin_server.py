@@ -0,0 +1,165 @@
+"""Local HTTP stand-in for the competitor sites, serving recorded fixtures.
+
+GET /<competitor_key> returns benchmarks/fixtures/<competitor_key>.html.
+Latency, server errors and 403s can be injected to mimic real sites.
+
+    python benchmarks/standin_server.py --port 8765 --latency 0.2 --error-rate 0.1
+"""
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class StandInServer:
+    """Threaded HTTP server answering like the competitor sites would"""
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, port=0, host_count=1, latency=0.0, jitter=0.0,
+                 error_rate=0.0, forbidden_rate=0.0, pad_kb=0, etags=True, seed=0):
+        self.latency = latency  # seconds before each response
+        self.jitter = jitter  # extra random latency, up to this many seconds
+        self.error_rate = error_rate  # share of requests answered with 503
+        self.forbidden_rate = forbidden_rate  # share of requests answered with 403
+        self.etags = etags  # send ETags and honour If-None-Match
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.pages = {}
+        padding = self._padding(pad_kb)
+        for filename in sorted(os.listdir(fixtures_dir)):
+            key, ext = os.path.splitext(filename)
+            if ext != ".html":
+                continue
+            with open(os.path.join(fixtures_dir, filename), "rb") as f:
+                body = f.read()
+            if padding:
+                # Mimic pages that ship megabytes of inlined JS
+                body = body.replace(b"</head>", padding + b"</head>", 1)
+            self.pages[key] = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:16])
+
+        # Listen on 127.0.0.1, 127.0.0.2, ... so each competitor gets its own
+        # host, as on the real sites. Platforms with only 127.0.0.1 share it.
+        handler = self._handler(self)
+        self.servers = [ThreadingHTTPServer(("127.0.0.1", port), handler)]
+        self.port = self.servers[0].server_address[1]
+        for i in range(2, min(host_count, 254) + 1):
+            try:
+                self.servers.append(ThreadingHTTPServer((f"127.0.0.{i}", self.port), handler))
+            except OSError:
+                break
+        for httpd in self.servers:
+            httpd.daemon_threads = True
+        self._threads = []
+
+    def url_for(self, key, host_index=0):
+        """URL of a fixture, on the host_index-th loopback host"""
+        host = self.servers[host_index % len(self.servers)].server_address[0]
+        return f"http://{host}:{self.port}/{key}"
+
+    def start(self):
+        for httpd in self.servers:
+            thread = threading.Thread(target=httpd.serve_forever, name="standin-server", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        for httpd in self.servers:
+            httpd.shutdown()
+            httpd.server_close()
+
+    def pick_status(self):
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+        if roll < self.error_rate:
+            return 503, delay
+        if roll < self.error_rate + self.forbidden_rate:
+            return 403, delay
+        return 200, delay
+
+    @staticmethod
+    def _padding(pad_kb):
+        if not pad_kb:
+            return b""
+        chunk = b"var _pad=[1,2,3,4,5,6,7,8,9,10];"
+        return b"<script>" + chunk * (pad_kb * 1024 // len(chunk)) + b"</script>"
+
+    @staticmethod
+    def _handler(server):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                key = self.path.split("?", 1)[0].strip("/")
+                status, delay = server.pick_status()
+                if delay:
+                    time.sleep(delay)
+
+                page = server.pages.get(key)
+                if page is None:
+                    status = 404
+                if status != 200:
+                    self._send(status, b"<html><body>Error</body></html>")
+                    return
+
+                body, etag = page
+                if server.etags and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._send(200, body, etag if server.etags else None)
+
+            def _send(self, status, body, etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--hosts", type=int, default=8, help="loopback hosts to listen on (127.0.0.1..N)")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--forbidden-rate", type=float, default=0.0)
+    parser.add_argument("--pad-kb", type=int, default=0)
+    parser.add_argument("--no-etags", action="store_true")
+    args = parser.parse_args()
+
+    server = StandInServer(
+        port=args.port, host_count=args.hosts, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, forbidden_rate=args.forbidden_rate,
+        pad_kb=args.pad_kb, etags=not args.no_etags,
+    )
+    server.start()
+    for i, key in enumerate(server.pages):
+        print(f"{key}: {server.url_for(key, i)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+
+# Subscriber queues hold at most this many events; a viewer that falls
+# further behind is sent the full state instead
+QUEUE_SIZE = 16
+
+# Marker queued for a subscriber that missed events
+RESYNC = object()
+
+
+class FeedFull(Exception):
+    """Raised by ChangeFeed.subscribe when max_subscribers streams are open"""
+
+
+def _changed(old, new):
+    """Keys of competitors whose latest snapshot differs, and keys that are gone"""
+    changed = [
+        key for key, snapshot in new.items()
+        if key not in old or (old[key] is not snapshot and (
+            old[key].last_updated != snapshot.last_updated
+            or old[key].success != snapshot.success
+            or old[key].extractor_version != snapshot.extractor_version
+        ))
+    ]
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+def fingerprint(snapshots):
+    """Identifies the data behind the cards, equal in every worker that holds the same data"""
+    digest = hashlib.sha256()
+    for key in sorted(snapshots):
+        snapshot = snapshots[key]
+        digest.update(f"{key}\0{snapshot.last_updated}\0{snapshot.success}\0{snapshot.extractor_version}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def format_event(event, data, event_id=None):
+    """A server-sent event carrying data as JSON"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class ChangeFeed:
+    """Pushes the competitors that changed to every open dashboard.
+
+    One watcher thread per process follows the versions the store
+    publishes. When the data changes, only the changed competitors are
+    rendered (by render(snapshots, keys), which returns the payload), once,
+    into a single server-sent event that every subscriber's queue then
+    shares. Many viewers cost one render per change, not one per viewer.
+
+    Events are identified by a fingerprint of the data rather than the
+    store's version counter, which differs between worker processes, so a
+    browser reconnecting to any worker with its Last-Event-ID only gets
+    what it has not seen.
+
+    Every open stream holds a server thread, so at most max_subscribers
+    are served at once; beyond that subscribe() raises FeedFull and the
+    dashboard falls back to polling.
+    """
+
+    def __init__(self, store, render, poll_interval=1.0, heartbeat=15.0, max_duration=300.0, max_subscribers=8):
+        self.store = store
+        self.render = render
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat  # seconds between keep-alive comments
+        self.max_duration = max_duration  # streams end after this; browsers reconnect by themselves
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Condition()
+        self._subscribers = set()
+        self._watcher = None
+        self._snapshots = None
+        self._version = None
+        self._fingerprint = None
+        self._state = {}  # every card and the totals, for subscribers that need everything
+
+    def subscribe(self):
+        """Register a subscriber and return its queue, for stream() and unsubscribe()
+
+        Raises FeedFull when max_subscribers are already subscribed.
+        """
+        subscriber = queue.Queue(QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise FeedFull(f"{len(self._subscribers)} dashboards are already subscribed")
+            self._subscribers.add(subscriber)
+            if self._watcher is None:
+                self._load()
+                self._watcher = threading.Thread(target=self._watch, name="change-feed", daemon=True)
+                self._watcher.start()
+            self._lock.notify_all()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber, last_event_id=None):
+        """Yield server-sent events for a subscriber until max_duration passes
+
+        A subscriber without the current data (last_event_id is not our
+        fingerprint) first gets every card. The subscriber is unsubscribed
+        when the stream ends.
+        """
+        try:
+            yield f"retry: {int(self.poll_interval * 3000)}\n\n"
+            if last_event_id != self._fingerprint:
+                yield self._full_event()
+            deadline = time.monotonic() + self.max_duration
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield self._full_event() if event is RESYNC else event
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _load(self):
+        """Render every competitor once, as the starting state"""
+        current = self.store.current()
+        payload = self.render(current.snapshots, list(current.snapshots))
+        self._snapshots = current.snapshots
+        self._version = current.version
+        self._fingerprint = fingerprint(current.snapshots)
+        self._state = payload
+
+    def _full_event(self):
+        with self._lock:
+            data = {**self._state, 'full': True}
+            event_id = self._fingerprint
+        return format_event('update', data, event_id)
+
+    def _watch(self):
+        while True:
+            with self._lock:
+                # Nobody is listening: stop polling until someone subscribes
+                while not self._subscribers:
+                    self._lock.wait()
+            time.sleep(self.poll_interval)
+            try:
+                self._publish()
+            except Exception as e:
+                logging.error(f"Could not publish dashboard changes: {str(e)}")
+
+    def _publish(self):
+        current = self.store.current()
+        if current.version == self._version:
+            return
+        changed, removed = _changed(self._snapshots, current.snapshots)
+        self._snapshots = current.snapshots
+        self._version = current.version
+        if not changed and not removed:
+            return
+        event_id = fingerprint(current.snapshots)
+
+        # Rendered once for every subscriber
+        payload = self.render(current.snapshots, changed)
+        with self._lock:
+            cards = {key: html for key, html in self._state.get('cards', {}).items() if key not in removed}
+            cards.update(payload['cards'])
+            self._state = {**payload, 'cards': cards}
+            self._fingerprint = event_id
+            subscribers = list(self._subscribers)
+        event = format_event('update', {**payload, 'removed': removed}, event_id)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Too far behind to catch up event by event
+                self._resync(subscriber)
+        logging.debug(f"Pushed {len(changed)} changed competitors to {len(subscribers)} dashboards")
+
+    @staticmethod
+    def _resync(subscriber):
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            subscriber.put_nowait(RESYNC)
+        except queue.Full:
+            pass
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import zlib
+
+# One CSV row per plan; snapshots without plans get one row with empty plan fields
+CSV_COLUMNS = (
+    'competitor', 'name', 'url', 'last_updated', 'success', 'error',
+    'currency', 'billing_period',
+    'plan_name', 'plan_price', 'plan_amount', 'plan_currency', 'plan_billing_period', 'plan_monthly_amount',
+)
+
+# Output is handed to the server in pieces of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+
+def ndjson_chunks(records):
+    """Serialize records (dicts) as newline-delimited JSON, a few at a time"""
+    buffer = []
+    size = 0
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_chunks(records):
+    """Flatten records into CSV with one row per plan, a few rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for record in records:
+        pricing_data = record.get('pricing_data') or {}
+        head = (
+            record['competitor'], record['name'], record['url'], record['last_updated'],
+            record['success'], record.get('error') or '',
+            pricing_data.get('currency') or '', pricing_data.get('billing_period') or '',
+        )
+        plans = pricing_data.get('plans') or [None]
+        for plan in plans:
+            if plan is None:
+                writer.writerow(head + ('',) * 6)
+                continue
+            writer.writerow(head + tuple(
+                '' if value is None else value
+                for value in (
+                    plan.get('name'), plan.get('price'), plan.get('amount'),
+                    plan.get('currency'), plan.get('billing_period'), plan.get('monthly_amount'),
+                )
+            ))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzipped(chunks, level=6):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encoded(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8')
@@ -0,0 +1,98 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from extractors import GenericExtractor, resolve_extractor
+from parsing import ParsedPage
+from pricing import normalize_plans
+
+
+def extract_pricing(extractor_ref, page, generic_extractor):
+    """Extract pricing data with the referenced extractor or the generic one
+
+    Returns (pricing_data, fallback), where fallback names the extractor
+    that was fallen back to, or is None.
+    """
+    extractor = resolve_extractor(extractor_ref)
+    if extractor is None:
+        return generic_extractor.extract(page), None
+    pricing_data = extractor.extract(page)
+    if pricing_data is not None:
+        return pricing_data, None
+    return generic_extractor.extract(page), 'generic'
+
+
+def extract_page(extractor_ref, content, encoding=None, generic_extractor=None):
+    """Parse a fetched page and extract its normalized pricing data
+
+    Takes the raw body and returns (pricing_data, info), with the page's
+    stage timings, the total time and any extractor fallback in info.
+    Only small, picklable values go in and out, so this can run in a
+    worker process.
+    """
+    started = time.perf_counter()
+    page = ParsedPage(content, encoding)
+    pricing_data, fallback = extract_pricing(extractor_ref, page, generic_extractor or GenericExtractor())
+    # Add numeric amount, currency, period and monthly price to every plan
+    pricing_data = normalize_plans(pricing_data)
+    return pricing_data, {
+        'timings': page.timings,
+        'elapsed': time.perf_counter() - started,
+        'fallback': fallback,
+    }
+
+
+def process_context():
+    """Multiprocessing context for extraction workers"""
+    # forkserver children start from a clean process, not a copy of a
+    # multi-threaded one
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class ExtractionPool:
+    """Runs extract_page in worker processes, or inline when workers is 0.
+
+    Parsing and trafilatura are pure CPU work; in worker processes they do
+    not hold the GIL of the process serving web requests, and several pages
+    are parsed on several cores while other competitors are still fetching.
+    The pool starts on first use.
+    """
+
+    def __init__(self, workers=0):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def extract(self, extractor_ref, content, encoding=None, generic_extractor=None):
+        """Run extract_page, in a worker process when the pool has workers"""
+        if not self.workers:
+            return extract_page(extractor_ref, content, encoding, generic_extractor)
+        executor = self._get_executor()
+        try:
+            return executor.submit(extract_page, extractor_ref, content, encoding, generic_extractor).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a new pool next time
+            logging.warning("Extraction worker died; parsing the page inline")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            return extract_page(extractor_ref, content, encoding, generic_extractor)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=process_context())
+                logging.info(f"Started {self.workers} extraction worker processes")
+            return self._executor
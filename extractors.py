@@ -0,0 +1,568 @@
+import hashlib
+import json
+import re
+import threading
+
+# Declarative pricing extractors, one spec per competitor.
+#
+# Each rule adds its plan when every group in 'all' has at least one of its
+# tokens somewhere in the page text (an empty 'all' always matches). Tokens
+# are case-sensitive unless the rule sets 'ignore_case'. Other keys:
+#
+#   text          'text' for the visible page text, 'clean_text' to prefer
+#                 the trafilatura extract
+#   extract       'pricing' for the pricing-sentence extract, 'head' for the
+#                 first 500 characters of the text
+#   sparse_rules  extra rules applied only when at most 'sparse_threshold'
+#                 plans matched
+#   fallback      what to return when no plan matched: 'all' for every
+#                 plan in the spec, 'generic' for the generic extractor
+#
+# The plan dicts are shared between scrapes and must not be mutated.
+EXTRACTOR_SPECS = {
+    'carta': {
+        'currency': 'GBP',
+        'billing_period': 'monthly',
+        'text': 'text',
+        'extract': 'pricing',
+        'rules': [
+            {
+                'all': [['Raise']],
+                'plan': {
+                    'name': 'Raise',
+                    'price': '£21/month',
+                    'description': 'Up to five stakeholders (£250/year)',
+                    'features': ['Cap table management', 'Advance Assurance', 'Round modelling'],
+                },
+            },
+            {
+                'all': [['Build']],
+                'plan': {
+                    'name': 'Build',
+                    'price': 'Contact for pricing',
+                    'description': 'Ideal for early-stage startups',
+                    'features': ['Everything in Raise', 'Round closing', 'S/EIS'],
+                },
+            },
+            {
+                'all': [['Grow']],
+                'plan': {
+                    'name': 'Grow',
+                    'price': 'Contact for pricing',
+                    'description': 'Essentials for growing companies',
+                    'features': ['Everything in Build', 'EMI & CSOP valuations', 'EMI share plans'],
+                },
+            },
+            {
+                'all': [['Scale']],
+                'plan': {
+                    'name': 'Scale',
+                    'price': 'Contact for pricing',
+                    'description': 'Features for scaling businesses',
+                    'features': ['Everything in Grow', '409A & growth share valuations', 'Compensation management'],
+                },
+            },
+        ],
+    },
+    'bolago': {
+        'currency': 'SEK',
+        'billing_period': 'monthly',
+        # trafilatura gives better text for the Swedish content
+        'text': 'clean_text',
+        'extract': 'head',
+        'fallback': 'all',
+        'rules': [
+            {
+                'all': [['gratis', 'free']],
+                'ignore_case': True,
+                'plan': {
+                    'name': 'Gratis',
+                    'price': '0 kr/month',
+                    'description': 'Basic plan, always free',
+                    'features': ['Cap table (up to 5 shareholders)', 'Access to legal templates', 'Basic reporting'],
+                },
+            },
+            {
+                'all': [['starter'], ['395', '3950', '3 950']],
+                'ignore_case': True,
+                'plan': {
+                    'name': 'Starter',
+                    'price': '329 kr/month',
+                    'description': 'Monthly subscription (3,950 kr/year)',
+                    'features': ['Cap table (up to 15 shareholders)', 'Up to 2 users', 'Document management', 'E-Signature'],
+                },
+            },
+            {
+                'all': [['grow'], ['1695', '16950', '16 950']],
+                'ignore_case': True,
+                'plan': {
+                    'name': 'Grow',
+                    'price': '1,413 kr/month',
+                    'description': 'Monthly subscription (16,950 kr/year)',
+                    'features': ['Cap table (up to 25 shareholders)', 'Board portal', 'General meetings', 'Option programs'],
+                },
+            },
+            {
+                'all': [['pro', 'enterprise']],
+                'ignore_case': True,
+                'plan': {
+                    'name': 'Pro',
+                    'price': 'Custom quote',
+                    'description': '12-month commitment',
+                    'features': ['Unlimited users', 'Custom setups', 'Legal consulting support'],
+                },
+            },
+        ],
+    },
+    'nvr': {
+        'currency': 'SEK',
+        'billing_period': 'monthly',
+        'text': 'text',
+        'extract': 'pricing',
+        'rules': [
+            {
+                'all': [['Basic'], ['0 kr/månad']],
+                'plan': {
+                    'name': 'Basic',
+                    'price': '0 kr/månad',
+                    'description': 'För bolag med få aktieägare och förändringar',
+                    'features': ['Digital aktiebok', 'Aktiebok som PDF', 'Investor relations', 'Synk med Skatteverket'],
+                },
+            },
+            {
+                'all': [['Starter'], ['49 kr/månad']],
+                'plan': {
+                    'name': 'Starter',
+                    'price': 'Från 49 kr/månad',
+                    'description': 'Betala per aktieägare',
+                    'features': ['Kategorisering av aktieägare', 'Översiktssida med statistik', 'Rapporter i PDF och Excel'],
+                },
+            },
+            {
+                'all': [['Pro'], ['750 kr/månad']],
+                'plan': {
+                    'name': 'Pro',
+                    'price': 'Från 750 kr/månad',
+                    'description': 'Betala per stakeholder',
+                    'features': ['Optioner och derivat', 'Avancerade överlåtelser', 'Prioriterad support'],
+                },
+            },
+        ],
+    },
+    'ledgy': {
+        'currency': 'EUR',
+        'billing_period': 'monthly',
+        'text': 'text',
+        'extract': 'pricing',
+        'rules': [
+            {
+                'all': [['Growth'], ['€900/year']],
+                'plan': {
+                    'name': 'Growth',
+                    'price': '€75/month',
+                    'description': '25 to 50 stakeholders included (€900/year)',
+                    'features': ['Cap Table Management', 'Document templating', 'Employee dashboards', 'Custom reporting'],
+                },
+            },
+            {
+                'all': [['Scale'], ['€3k/year']],
+                'plan': {
+                    'name': 'Scale',
+                    'price': '€250/month',
+                    'description': '50+ stakeholders included (€3k/year)',
+                    'features': ['70+ HRIS integrations', 'Exit waterfall modeling', 'Automated granting', 'Onboarding Consultant'],
+                },
+            },
+            {
+                'all': [['Enterprise']],
+                'plan': {
+                    'name': 'Enterprise',
+                    'price': 'Custom pricing',
+                    'description': '200+ stakeholders included',
+                    'features': ['GraphQL API access', 'SAML SSO', 'SCIM provisioning', 'IPO preparation'],
+                },
+            },
+        ],
+    },
+    'cakeequity': {
+        # Based on actual Cake Equity pricing structure
+        'currency': 'USD',
+        'billing_period': 'monthly',
+        'text': 'text',
+        'extract': 'pricing',
+        'rules': [
+            {
+                'all': [],
+                'plan': {
+                    'name': 'Free',
+                    'price': 'Free',
+                    'description': '5 stakeholders included',
+                    'features': ['Cap table management', 'Stock options & SAFE notes', 'Shareholder access'],
+                },
+            },
+            {
+                'all': [],
+                'plan': {
+                    'name': 'Starter',
+                    'price': '$40/month',
+                    'description': '30 stakeholders + $3 per additional',
+                    'features': ['Cap table management', 'Shareholder vesting', 'Digital signing', 'Scenario modelling'],
+                },
+            },
+            {
+                'all': [],
+                'plan': {
+                    'name': 'Growth',
+                    'price': '$80/month',
+                    'description': '30 stakeholders + $5 per additional',
+                    'features': ['All Starter features', 'Stock Options & RSUs', 'Legal templates', 'Team equity benchmarks'],
+                },
+            },
+            {
+                'all': [],
+                'plan': {
+                    'name': 'Pro',
+                    'price': 'Custom pricing',
+                    'description': 'Large cap tables with discounted rates',
+                    'features': ['409A Valuation', 'IFRS 2 compliance', 'International options', 'Priority support'],
+                },
+            },
+        ],
+    },
+    'mantle': {
+        # Mantle known pricing structure: Free, $100/month ($1200/year), $250/month ($3000/year)
+        'currency': 'USD',
+        'billing_period': 'monthly',
+        'text': 'text',
+        'extract': 'pricing',
+        'fallback': 'generic',
+        'rules': [
+            {
+                'all': [['free']],
+                'ignore_case': True,
+                'plan': {
+                    'name': 'Free',
+                    'price': 'Free',
+                    'description': 'Basic equity management',
+                    'features': ['Cap table management', 'Basic reporting'],
+                },
+            },
+            # Look for yearly pricing and convert to monthly
+            {
+                'all': [['1200', '$1,200']],
+                'plan': {
+                    'name': 'Starter',
+                    'price': '$100/month',
+                    'description': 'Growing companies ($1,200/year)',
+                    'features': ['Advanced cap table', 'Stakeholder portal', 'Reporting'],
+                },
+            },
+            {
+                'all': [['3000', '$3,000']],
+                'plan': {
+                    'name': 'Pro',
+                    'price': '$250/month',
+                    'description': 'Scaling companies ($3,000/year)',
+                    'features': ['Everything in Starter', 'Advanced analytics', 'Priority support'],
+                },
+            },
+        ],
+        # Fallback to looking for monthly pricing when only the free plan was found
+        'sparse_threshold': 1,
+        'sparse_rules': [
+            {
+                'all': [['$100']],
+                'plan': {
+                    'name': 'Starter',
+                    'price': '$100/month',
+                    'description': 'Growing companies',
+                    'features': ['Advanced cap table', 'Stakeholder portal', 'Reporting'],
+                },
+            },
+            {
+                'all': [['$250']],
+                'plan': {
+                    'name': 'Pro',
+                    'price': '$250/month',
+                    'description': 'Scaling companies',
+                    'features': ['Everything in Starter', 'Advanced analytics', 'Priority support'],
+                },
+            },
+        ],
+    },
+}
+
+
+def _trie_pattern(words):
+    """Regex alternation for words, factored by common prefix (longest match first)"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        ends_here = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Optional continuation is greedy, so the longest word wins
+        return '(?:' + body + ')?' if ends_here else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Finds which of many literal tokens occur in a text in one regex pass.
+
+    Tokens are (token, ignore_case) pairs. Case-sensitive and insensitive
+    tokens are compiled into two prefix tries inside a single pattern of
+    lookaheads, so both tries are tried at every position and overlapping
+    tokens are found. Shorter tokens contained in a longer match are
+    derived from the matched text.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = frozenset(tokens)
+        sensitive = sorted(token for token, ignore_case in self.tokens if not ignore_case)
+        insensitive = sorted({token.lower() for token, ignore_case in self.tokens if ignore_case})
+
+        if sensitive and insensitive:
+            sensitive_pattern = _trie_pattern(sensitive)
+            insensitive_pattern = '(?i:' + _trie_pattern(insensitive) + ')'
+            # Where a case-sensitive token starts, still look for an
+            # insensitive one at the same position
+            pattern = (
+                f'(?=({sensitive_pattern}))(?:(?=({insensitive_pattern})))?'
+                f'|(?=({insensitive_pattern}))'
+            )
+        elif sensitive:
+            pattern = f'(?=({_trie_pattern(sensitive)}))'
+        elif insensitive:
+            pattern = f'(?=((?i:{_trie_pattern(insensitive)})))'
+        else:
+            pattern = None
+        self._regex = re.compile(pattern) if pattern else None
+
+        self._implied = {}
+        self._implied_lock = threading.Lock()
+
+    def find(self, text):
+        """Set of (token, ignore_case) pairs that occur in text"""
+        found = set()
+        if self._regex is None or not text:
+            return found
+        seen = set()
+        for match in self._regex.finditer(text):
+            for matched in match.groups():
+                if matched and matched not in seen:
+                    seen.add(matched)
+                    found |= self._tokens_in(matched)
+        return found
+
+    def _tokens_in(self, matched):
+        """Tokens contained in a matched string (cached per distinct match)"""
+        tokens = self._implied.get(matched)
+        if tokens is None:
+            matched_lower = matched.lower()
+            tokens = frozenset(
+                (token, ignore_case) for token, ignore_case in self.tokens
+                if (token.lower() in matched_lower if ignore_case else token in matched)
+            )
+            with self._implied_lock:
+                self._implied[matched] = tokens
+        return tokens
+
+
+class SpecExtractor:
+    """Pricing extractor compiled from a declarative spec"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.rules = [self._compile_rule(rule) for rule in spec.get('rules', [])]
+        self.sparse_rules = [self._compile_rule(rule) for rule in spec.get('sparse_rules', [])]
+        self.sparse_threshold = spec.get('sparse_threshold', 0)
+
+        tokens = set()
+        for groups, plan in self.rules + self.sparse_rules:
+            for group in groups:
+                tokens.update(group)
+        self.matcher = KeywordMatcher(tokens)
+
+    @staticmethod
+    def _compile_rule(rule):
+        ignore_case = rule.get('ignore_case', False)
+        groups = [frozenset((token, ignore_case) for token in group) for group in rule.get('all', [])]
+        return groups, rule['plan']
+
+    def extract(self, page):
+        """Extract pricing data, or None when the spec says to use the generic extractor"""
+        if self.spec.get('text') == 'clean_text':
+            text_content = page.clean_text or page.text
+        else:
+            text_content = page.text
+
+        found = self.matcher.find(text_content)
+        plans = [plan for groups, plan in self.rules if all(group & found for group in groups)]
+        if self.sparse_rules and len(plans) <= self.sparse_threshold:
+            plans += [plan for groups, plan in self.sparse_rules if all(group & found for group in groups)]
+
+        if not plans:
+            fallback = self.spec.get('fallback')
+            if fallback == 'generic':
+                return None
+            if fallback == 'all':
+                plans = [plan for groups, plan in self.rules]
+
+        if self.spec.get('extract') == 'head':
+            raw_text_extract = text_content[:500] if text_content else "No clean text extracted"
+        else:
+            raw_text_extract = page.pricing_extract
+
+        return {
+            'plans': list(plans),
+            'currency': self.spec['currency'],
+            'billing_period': self.spec['billing_period'],
+            'raw_text_extract': raw_text_extract,
+        }
+
+
+# Common pricing patterns, combined so a line is scanned once for all of them
+PRICE_MENTION_RE = re.compile(
+    r'\d+(?:,\d{3})*(?:\.\d{2})?\s*(?:per|/)\s*(?:month|year|user)'  # 100 per month
+    r'|[\$£€]\d+(?:,\d{3})*(?:\.\d{2})?'  # $100, £1,000, €50.00
+    r'|free|gratis|kostenlos'  # Free plans
+    r'|contact|custom|enterprise',  # Contact for pricing
+    re.IGNORECASE,
+)
+
+# Plan names, as whole words so 'product' or 'freedom' do not count
+PLAN_NAME_RE = re.compile(
+    r'\b(?:basic|starter|pro|enterprise|premium|growth|scale|free|standard)\b',
+    re.IGNORECASE,
+)
+
+LINE_RE = re.compile(r'[^\n]+')
+
+
+class GenericExtractor:
+    """Pricing extraction for sites we haven't specifically implemented.
+
+    Streams over the text line by line, once, collecting price mentions and
+    short lines that name a plan. Scanning stops as soon as both
+    max_mentions mentions and max_plans plans have been found.
+    """
+
+    def __init__(self, max_mentions=10, max_plans=12, max_plan_line=100):
+        self.max_mentions = max_mentions
+        self.max_plans = max_plans
+        self.max_plan_line = max_plan_line  # plan names are usually short
+
+    def extract(self, page):
+        # Use trafilatura to get clean text content, with fallback to the page text
+        return self.extract_text(page.clean_text or page.text or "")
+
+    def extract_text(self, text_content):
+        """Extract generic pricing data from plain text"""
+        plans = []
+        pricing_info = []
+        max_mentions = self.max_mentions
+        max_plans = self.max_plans
+        max_plan_line = self.max_plan_line
+
+        for line_match in LINE_RE.finditer(text_content):
+            line = line_match.group()
+
+            if len(pricing_info) < max_mentions:
+                for mention in PRICE_MENTION_RE.finditer(line):
+                    pricing_info.append(mention.group())
+                    if len(pricing_info) >= max_mentions:
+                        break
+
+            if len(plans) < max_plans:
+                line = line.strip()
+                if line and len(line) < max_plan_line and PLAN_NAME_RE.search(line):
+                    plans.append({
+                        'name': line,
+                        'price': 'Not specified',
+                        'features': [],
+                        'description': ''
+                    })
+
+            if len(pricing_info) >= max_mentions and len(plans) >= max_plans:
+                break
+
+        # If no structured plans found, create a generic entry
+        if not plans:
+            plans.append({
+                'name': 'General Pricing',
+                'price': ', '.join(pricing_info[:5]) if pricing_info else 'Contact for pricing',
+                'features': [],
+                'description': 'Pricing information extracted from page content'
+            })
+
+        extract_text = text_content[:500] + '...' if len(text_content) > 500 else text_content
+
+        return {
+            'plans': plans,
+            'currency': 'Unknown',
+            'billing_period': 'unknown',
+            'raw_text_extract': extract_text,
+            'pricing_mentions': pricing_info
+        }
+
+
+# Specs are compiled once, on first use
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def get_extractor(competitor_key):
+    """Compiled extractor for a competitor, or None if it has no spec"""
+    extractor = _compiled.get(competitor_key)
+    if extractor is None and competitor_key in EXTRACTOR_SPECS:
+        with _compiled_lock:
+            extractor = _compiled.get(competitor_key)
+            if extractor is None:
+                extractor = _compiled[competitor_key] = SpecExtractor(EXTRACTOR_SPECS[competitor_key])
+    return extractor
+
+
+# How registry extractor references ('kind:name') are resolved. A factory
+# returns the extractor, or None to use the generic extractor.
+EXTRACTOR_TYPES = {
+    'spec': get_extractor,
+    'generic': lambda name: None,
+}
+
+
+def resolve_extractor(reference):
+    """Extractor for a reference such as 'spec:bolago', or None for 'generic'"""
+    kind, _, name = (reference or 'generic').partition(':')
+    factory = EXTRACTOR_TYPES.get(kind)
+    if factory is None:
+        raise ValueError(f"Unknown extractor type: {kind}")
+    extractor = factory(name)
+    if extractor is None and kind != 'generic':
+        raise ValueError(f"Unknown extractor: {reference}")
+    return extractor
+
+
+# Bump when a code change alters what extractors return, so backfill.py
+# re-extracts archived pages; edits to a spec are picked up by themselves
+EXTRACTOR_CODE_VERSION = 1
+
+_versions = {}
+
+
+def extractor_version(reference):
+    """Short hash identifying the output of the referenced extractor"""
+    version = _versions.get(reference)
+    if version is None:
+        kind, _, name = (reference or 'generic').partition(':')
+        spec = EXTRACTOR_SPECS.get(name) if kind == 'spec' else None
+        source = json.dumps([EXTRACTOR_CODE_VERSION, reference, spec], sort_keys=True)
+        version = _versions[reference] = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+    return version
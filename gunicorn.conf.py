@@ -0,0 +1,8 @@
+# Read by gunicorn from the working directory, for both the workflow and
+# the deployment command. Dashboards hold an /api/stream connection open,
+# so each worker serves requests from a pool of threads rather than one
+# request at a time. Streams are capped well below the thread count
+# (PRICESCRAPE_STREAM_SUBSCRIBERS, 8 by default) so other routes always
+# find a free thread.
+worker_class = "gthread"
+threads = 32
@@ -0,0 +1,411 @@
+import codecs
+import hashlib
+import logging
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from bs4.dammit import EncodingDetector
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker
+
+# Timings and RequestHandle of the request in flight on each thread, used
+# by the connection and retry hooks below
+_local = threading.local()
+
+
+class RequestHandle:
+    """Lets another thread abandon a request made with get(handle=...).
+
+    cancel() shuts down the request's connection, so a read blocked on a
+    slow host fails at once, and stops any further retries.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._connection is not None:
+                _shutdown(self._connection)
+
+    def _attach(self, connection):
+        with self._lock:
+            if self.cancelled:
+                raise ConnectionAbortedError("Request abandoned")
+            self._connection = connection
+
+    def _detach(self):
+        # Under the lock, so a connection back in the pool is never shut down
+        with self._lock:
+            self._connection = None
+
+
+def _shutdown(connection):
+    sock = getattr(connection, 'sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _attach_connection(connection):
+    handle = getattr(_local, 'handle', None)
+    if handle is not None:
+        handle._attach(connection)
+
+
+def _add_timing(name, amount):
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + amount
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """Connection that records how long DNS resolution and TCP connect took"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _add_timing('connect', time.perf_counter() - start)
+
+    def request(self, *args, **kwargs):
+        _attach_connection(self)
+        return super().request(*args, **kwargs)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that also records the TLS handshake time"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _add_timing('connect', time.perf_counter() - start)
+
+    def connect(self):
+        timings = getattr(_local, 'timings', None)
+        connect_before = timings.get('connect', 0) if timings is not None else 0
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            if timings is not None:
+                tcp = timings.get('connect', 0) - connect_before
+                _add_timing('tls', max(time.perf_counter() - start - tcp, 0))
+
+    def request(self, *args, **kwargs):
+        _attach_connection(self)
+        return super().request(*args, **kwargs)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _CountingRetry(Retry):
+    """Retry policy that counts the retries it allows, and allows none once the request is abandoned"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        handle = getattr(_local, 'handle', None)
+        if handle is not None and handle.cancelled:
+            raise MaxRetryError(_pool, url, error)
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        _add_timing('retries', 1)
+        return new_retry
+
+
+# Bytes read before looking for a declared charset
+SNIFF_BYTES = 2048
+
+
+class ResponseBody:
+    """Body of a streamed response, read by read_body()"""
+
+    __slots__ = ('content', 'encoding', 'digest', 'size', 'truncated', 'cut_off', 'elapsed')
+
+    def __init__(self, content, encoding, digest, size, truncated, cut_off, elapsed):
+        self.content = content  # str when the charset was known while reading, else bytes
+        self.encoding = encoding
+        self.digest = digest  # sha256 hex of the bytes read
+        self.size = size  # bytes read
+        self.truncated = truncated  # stopped at max_bytes
+        self.cut_off = cut_off  # stopped after the cut-off marker
+        self.elapsed = elapsed  # seconds spent reading
+
+
+def read_body(response, max_bytes=None, encoding=None, cutoff=None, sink=None, chunk_size=65536):
+    """Read a streamed response body, bounded in size and decoded as it arrives
+
+    At most max_bytes are read. With cutoff (bytes), reading stops at the
+    end of the chunk in which the marker first appears. The charset is the
+    given encoding, else one declared at the top of the page (BOM or meta);
+    once known, chunks are decoded incrementally so the body is only ever
+    held as text. Pages without a known charset are returned as bytes for
+    the caller to sniff. The body is hashed as it is read, and the raw
+    bytes are also written to sink (e.g. an archive writer) if given.
+    """
+    start = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    truncated = cut_off = False
+    decoder = None
+    sniffed = encoding is not None
+    parts = []  # bytes until the charset is known, then str
+    tail = b''
+    for chunk in response.iter_content(chunk_size):
+        if max_bytes is not None and size + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - size]
+            truncated = True
+        size += len(chunk)
+        digest.update(chunk)
+        if sink is not None:
+            sink.write(chunk)
+
+        if decoder is not None:
+            parts.append(decoder.decode(chunk))
+        else:
+            parts.append(chunk)
+            if not sniffed and size >= SNIFF_BYTES:
+                # Look for a declared charset once, in the head of the page
+                sniffed = True
+                encoding = _declared_encoding(b''.join(parts))
+            if encoding is not None:
+                decoder = _incremental_decoder(encoding)
+                parts = [decoder.decode(b''.join(parts))]
+
+        if cutoff is not None:
+            if cutoff in tail + chunk:
+                cut_off = True
+            tail = chunk[-(len(cutoff) - 1):] if len(cutoff) > 1 else b''
+        if truncated or cut_off:
+            break
+    # Stopping early leaves unread data on the connection, so drop it
+    response.close()
+
+    if decoder is None and parts and not sniffed:
+        # Short page: look for a declared charset in what we have
+        encoding = _declared_encoding(b''.join(parts))
+        if encoding is not None:
+            decoder = _incremental_decoder(encoding)
+            parts = [decoder.decode(b''.join(parts))]
+    if decoder is not None:
+        content = ''.join(parts) + decoder.decode(b'', final=True)
+    else:
+        content = b''.join(parts)
+
+    if truncated:
+        logging.warning(f"Body of {response.url} cut at {max_bytes} bytes")
+    return ResponseBody(content, encoding, digest.hexdigest(), size, truncated, cut_off, time.perf_counter() - start)
+
+
+def _declared_encoding(head):
+    """Charset declared by a BOM or meta tag at the top of a page, or None"""
+    # Same places BeautifulSoup's UnicodeDammit looks first
+    encoding = EncodingDetector.strip_byte_order_mark(head)[1]
+    if encoding is None:
+        encoding = EncodingDetector.find_declared_encoding(head, is_html=True)
+    if encoding is None:
+        return None
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return None
+
+
+def _incremental_decoder(encoding):
+    return codecs.getincrementaldecoder(encoding)(errors='replace')
+
+
+class HttpClient:
+    """Long-lived HTTP client shared by every scrape.
+
+    Wraps a single requests.Session whose adapter keeps a keep-alive
+    connection pool per host, so repeat refreshes reuse warm TCP/TLS
+    connections. The session is only used for GETs with per-call headers,
+    which is safe to do from several threads at once.
+
+    Requests to a host whose circuit breaker is open fail immediately with
+    CircuitOpenError, and requests without an explicit timeout get one
+    adapted to the host's recent latency.
+    """
+
+    def __init__(self, headers=None, pool_connections=32, pool_maxsize=4, idle_timeout=90,
+                 breaker=None, latency=None):
+        self.pool_connections = pool_connections  # number of hosts to keep pools for
+        self.pool_maxsize = pool_maxsize  # connections kept per host
+        self.idle_timeout = idle_timeout  # seconds before an unused host pool is closed
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+
+        # Retry strategy for transient errors
+        retry = _CountingRetry(
+            total=3,
+            backoff_factor=1.0,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods={"GET", "HEAD"},
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self._lock = threading.Lock()
+        self._last_used = {}
+        # Counters carried over from pools that have been closed
+        self._retired_requests = 0
+        self._retired_connections = 0
+
+        # Fold the counters of pools the pool manager drops into our totals
+        self.adapter.poolmanager.pools.dispose_func = self._retire_pool
+        # Time connection setup on every pool the manager creates
+        self.adapter.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+    def get(self, url, handle=None, **kwargs):
+        """Issue a GET through the shared session
+
+        Timings of the request are available from last_timings() afterwards,
+        whether it succeeded or raised. A RequestHandle passed as handle can
+        abandon the request from another thread; abandoned requests do not
+        count against the host's circuit breaker, and an abandoned probe of
+        a half-open circuit hands the probe to the next request.
+        """
+        host = urlparse(url).hostname
+        if not self.breaker.allow(host):
+            _local.last_timings = {}
+            raise CircuitOpenError(f"Circuit open for {host}; not requesting {url}")
+        kwargs.setdefault('timeout', self.latency.timeout_for(host))
+        self.evict_idle()
+        with self._lock:
+            self._last_used[host] = time.monotonic()
+
+        timings = _local.timings = {}
+        _local.handle = handle
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, **kwargs)
+        except Exception:
+            if handle is not None and handle.cancelled:
+                # Neither a failure nor a success, but it may have been the probe
+                self.breaker.release_probe(host)
+            else:
+                self.breaker.record_failure(host)
+            raise
+        finally:
+            _local.timings = None
+            _local.handle = None
+            _local.last_timings = timings
+            if handle is not None:
+                handle._detach()
+
+        # Server errors that survived the retries count against the host
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure(host)
+        else:
+            self.breaker.record_success(host)
+
+        # Split the call into waiting for the response headers and reading
+        # the body; streamed bodies are read (and timed) by the caller
+        total = time.perf_counter() - start
+        headers_at = response.elapsed.total_seconds()
+        setup = timings.get('connect', 0) + timings.get('tls', 0)
+        timings['response'] = max(headers_at - setup, 0)
+        if not kwargs.get('stream'):
+            timings['download'] = max(total - headers_at, 0)
+        if not timings.get('retries'):
+            # Retried requests include backoff sleeps, not the host's latency
+            self.latency.observe(host, headers_at)
+        return response
+
+    def last_timings(self):
+        """Timings of the last get() on this thread
+
+        A dict with seconds spent in 'connect' (DNS and TCP), 'tls',
+        'response' (until the headers arrived, including retries) and
+        'download', plus the number of 'retries'. Stages that did not
+        happen, such as connecting on a reused connection, are absent.
+        """
+        return getattr(_local, 'last_timings', None) or {}
+
+    def evict_idle(self):
+        """Close the connection pools of hosts that have been idle too long"""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        with self._lock:
+            idle_hosts = {
+                host for host, last_used in self._last_used.items()
+                if now - last_used > self.idle_timeout
+            }
+            for host in idle_hosts:
+                del self._last_used[host]
+        if not idle_hosts:
+            return
+
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            if key.key_host in idle_hosts:
+                logging.debug(f"Closing idle connection pool for {key.key_host}")
+                try:
+                    del pools[key]
+                except KeyError:
+                    pass
+
+    def stats(self):
+        """Return connection reuse counters across all host pools"""
+        pools = self.adapter.poolmanager.pools
+        with self._lock:
+            requests_made = self._retired_requests
+            new_connections = self._retired_connections
+        for key in list(pools.keys()):
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            requests_made += pool.num_requests
+            new_connections += pool.num_connections
+        return {
+            'requests': requests_made,
+            'new_connections': new_connections,
+            'reused_connections': max(requests_made - new_connections, 0),
+            'open_pools': len(pools),
+        }
+
+    def close(self):
+        """Close every pooled connection"""
+        self.session.close()
+
+    def _retire_pool(self, pool):
+        """Record the counters of a pool that is being discarded, then close it"""
+        with self._lock:
+            self._retired_requests += pool.num_requests
+            self._retired_connections += pool.num_connections
+        pool.close()
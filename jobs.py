@@ -0,0 +1,132 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class RefreshJobQueue:
+    """Runs scraper refreshes as background jobs and tracks their progress.
+
+    Web requests only submit jobs and read their status, so a worker never
+    waits on the network while a crawl is in progress. Job state is also
+    written to the scraper's store, so a status request that lands on
+    another gunicorn worker can still answer it.
+    """
+
+    def __init__(self, scraper, max_workers=2, max_jobs=200, stored_job_ttl=86400):
+        self.scraper = scraper
+        self.store = scraper.store
+        self.max_jobs = max_jobs  # finished jobs beyond this are forgotten
+        self.stored_job_ttl = stored_job_ttl  # seconds stored jobs are kept
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="refresh-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def submit(self, competitor_keys=None):
+        """Queue a refresh of the given competitors (all by default) and return its job id"""
+        keys = list(competitor_keys) if competitor_keys else list(self.scraper.competitors)
+
+        with self._lock:
+            # Attach to an identical refresh that has not finished yet
+            for job in self._jobs.values():
+                if job['status'] in ('queued', 'running') and job['competitor_keys'] == keys:
+                    logging.info(f"Refresh of {', '.join(keys)} already pending as job {job['id']}")
+                    return job['id']
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'competitor_keys': keys,
+                'created': datetime.now().isoformat(),
+                'started': None,
+                'finished': None,
+                'competitors': {key: {'state': 'queued', 'error': None} for key in keys},
+                'success_count': 0,
+                'total': len(keys),
+                'error': None,
+            }
+            self._prune()
+
+        self._save(job_id)
+        try:
+            self.store.prune_jobs(self.stored_job_ttl)
+        except Exception as e:
+            logging.warning(f"Could not prune stored refresh jobs: {str(e)}")
+        self._executor.submit(self._run, job_id, keys)
+        logging.info(f"Queued refresh job {job_id} for {', '.join(keys)}")
+        return job_id
+
+    def get(self, job_id):
+        """Get a snapshot of a job's status, or None if it is unknown"""
+        job = self._snapshot(job_id)
+        if job is None:
+            # Possibly submitted to another worker process
+            return self.store.load_job(job_id)
+        return job
+
+    def _run(self, job_id, keys):
+        """Execute a job on the background executor"""
+        self._update(job_id, status='running', started=datetime.now().isoformat())
+        try:
+            results = self.scraper.scrape_all(keys, progress=lambda key, state, result: self._progress(job_id, key, state, result))
+            success_count = sum(1 for result in results.values() if result.get('success'))
+            self._update(job_id, status='finished', success_count=success_count)
+            logging.info(f"Refresh job {job_id} completed: {success_count}/{len(keys)} successful")
+        except Exception as e:
+            logging.error(f"Refresh job {job_id} failed: {str(e)}")
+            self._update(job_id, status='failed', error=str(e))
+        finally:
+            self._update(job_id, finished=datetime.now().isoformat())
+
+    def _progress(self, job_id, competitor_key, state, result):
+        """Record the progress of one competitor within a job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['competitors'][competitor_key] = {
+                'state': state,
+                'error': result.get('error') if result else None,
+            }
+        self._save(job_id)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+        self._save(job_id)
+
+    def _save(self, job_id):
+        """Write the current state of a job to the shared store"""
+        # Serialized, so an older snapshot never overwrites a newer one
+        with self._save_lock:
+            job = self._snapshot(job_id)
+            if job is None:
+                return
+            try:
+                self.store.save_job(job)
+            except Exception as e:
+                logging.warning(f"Could not store refresh job {job_id}: {str(e)}")
+
+    def _snapshot(self, job_id):
+        """Copy of a job tracked by this process, or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                **job,
+                'competitor_keys': list(job['competitor_keys']),
+                'competitors': {key: dict(state) for key, state in job['competitors'].items()},
+            }
+
+    def _prune(self):
+        """Forget the oldest finished jobs once we track more than max_jobs"""
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in ('finished', 'failed')]
+        for job_id in finished[:max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[job_id]
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import DATA_DIR
+
+# flock gives leases that every process on the host honours; without it
+# (Windows) leases only coordinate threads of one process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LeaseTimeout(Exception):
+    """Raised when a lease could not be acquired in time"""
+
+
+class Lease:
+    """A held lease.
+
+    waited says whether another holder had to be waited for; result is
+    what the previous holder published, or None. Results are handed over
+    through the lease itself, so they reach the next holder before (or
+    without) being written to the database.
+    """
+
+    def __init__(self, waited, result, publish):
+        self.waited = waited
+        self.result = result
+        self._publish = publish
+
+    def publish(self, result):
+        """Leave a JSON-serializable result for the next holder"""
+        self._publish(json.dumps(result))
+
+
+def _read_result(data):
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+
+class RefreshLeases:
+    """Exclusive per-competitor leases shared by every process on the host.
+
+    A lease is an flock on a file in the data directory. The kernel drops
+    it when the holder closes the file or exits, so a worker that crashes
+    mid-refresh never leaves a stale lease behind. The file holds the
+    result the last holder published.
+    """
+
+    def __init__(self, directory=None, timeout=120, poll_interval=0.1):
+        self.directory = directory or os.path.join(DATA_DIR, "locks")
+        self.timeout = timeout  # seconds to wait for a lease held elsewhere
+        self.poll_interval = poll_interval
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._local_locks = {}
+        self._local_results = {}
+
+    @contextmanager
+    def hold(self, key):
+        """Hold the lease for key; yields a Lease"""
+        if fcntl is None:
+            with self._hold_local(key) as lease:
+                yield lease
+            return
+
+        fd = os.open(os.path.join(self.directory, f"{key}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            waited = False
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if not waited:
+                        logging.info(f"Refresh of {key} already in progress; waiting for it")
+                    waited = True
+                    if time.monotonic() > deadline:
+                        raise LeaseTimeout(f"Timed out waiting for the refresh of {key} in progress")
+                    time.sleep(self.poll_interval)
+            # Only a holder that waited wants the result of the one before
+            result = _read_result(self._read(fd)) if waited else None
+            yield Lease(waited, result, lambda data: self._write(fd, data))
+        finally:
+            # Closing the file releases the lock
+            os.close(fd)
+
+    @contextmanager
+    def _hold_local(self, key):
+        with self._lock:
+            lock = self._local_locks.setdefault(key, threading.Lock())
+        waited = not lock.acquire(blocking=False)
+        if waited and not lock.acquire(timeout=self.timeout):
+            raise LeaseTimeout(f"Timed out waiting for the refresh of {key} in progress")
+        try:
+            result = _read_result(self._local_results.get(key)) if waited else None
+            yield Lease(waited, result, lambda data: self._local_results.__setitem__(key, data))
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _read(fd):
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(fd, 65536, offset)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+            offset += len(chunk)
+
+    @staticmethod
+    def _write(fd, data):
+        data = data.encode("utf-8")
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, data, 0)
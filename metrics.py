@@ -0,0 +1,233 @@
+import math
+import threading
+from bisect import bisect_left
+
+
+class Registry:
+    """Set of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """Base of a metric family with optional labels.
+
+    Children per label combination are created once and cached, so the
+    recording path is a dict lookup plus a locked add.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """Child metric for one combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def clear(self):
+        """Drop every label combination, e.g. before setting the current ones"""
+        with self._lock:
+            self._children.clear()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed upper bounds"""
+
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def totals(self):
+        """(count, sum) of the observations of every label combination"""
+        totals = {}
+        for values, child in self._items():
+            with child._lock:
+                totals[values] = (sum(child.counts), child.sum)
+        return totals
+
+    def samples(self):
+        for values, child in self._items():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ('le',), values + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        # Values are counted in their own bucket and accumulated on render
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+# Scrape metrics, labelled by competitor key
+SCRAPE_STAGE_SECONDS = Histogram(
+    'pricescrape_stage_seconds',
+    'Time spent in each stage of a scrape (wait, connect, tls, response, download, parse, trafilatura, extract).',
+    ['competitor', 'stage'],
+)
+SCRAPE_SECONDS = Histogram(
+    'pricescrape_scrape_seconds',
+    'Total time of a scrape of one competitor.',
+    ['competitor'],
+)
+SCRAPES = Counter(
+    'pricescrape_scrapes_total',
+    'Scrapes by outcome (success, unchanged, attached, failed).',
+    ['competitor', 'outcome'],
+)
+HTTP_RESPONSES = Counter(
+    'pricescrape_http_responses_total',
+    'HTTP responses received, by status code.',
+    ['competitor', 'status'],
+)
+HTTP_RETRIES = Counter(
+    'pricescrape_http_retries_total',
+    'Requests retried by the HTTP client after a connection error or retryable status.',
+    ['competitor'],
+)
+HTTP_RESPONSE_BYTES = Counter(
+    'pricescrape_http_response_bytes_total',
+    'Bytes of response bodies received.',
+    ['competitor'],
+)
+EXTRACTOR_FALLBACKS = Counter(
+    'pricescrape_extractor_fallbacks_total',
+    'Times a competitor extractor found nothing and another extractor was used.',
+    ['competitor', 'extractor'],
+)
+HTTP_POOL = Gauge(
+    'pricescrape_http_pool',
+    'Connection pool counters of the shared HTTP client.',
+    ['counter'],
+)
+CIRCUIT_STATE = Gauge(
+    'pricescrape_circuit_open',
+    'Hosts whose circuit breaker is open (1) or half-open (0.5); closed circuits are not listed.',
+    ['host'],
+)
+HOST_TIMEOUT = Gauge(
+    'pricescrape_host_timeout_seconds',
+    'Adaptive request timeout per host, from its recent latency.',
+    ['host'],
+)
@@ -0,0 +1,177 @@
+import sys
+import threading
+from types import MappingProxyType
+
+from pricing import normalize_plans
+
+# Plans and feature lists come out of the same extractor specs on every
+# scrape, so equal ones are shared rather than stored once per snapshot.
+# The caches are cleared when they grow past this many entries.
+MAX_SHARED = 4096
+
+_plans = {}
+_features = {}
+_shared_lock = threading.Lock()
+
+
+def _intern(value):
+    """Intern a string, so equal names, prices and features share one object"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def _shared(cache, key, build):
+    """Shared object for key, built and cached on first use"""
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        with _shared_lock:
+            if len(cache) >= MAX_SHARED:
+                cache.clear()
+            value = cache.setdefault(key, value)
+    return value
+
+
+def _features_of(features):
+    features = tuple(_intern(feature) for feature in features or ())
+    return _shared(_features, features, lambda: features) if features else ()
+
+
+class Plan:
+    """One pricing plan, as extracted and normalized.
+
+    Records are shared between snapshots and must not be mutated; build
+    them with Plan.from_dict.
+    """
+
+    __slots__ = ('name', 'price', 'description', 'features', 'amount', 'currency', 'billing_period', 'monthly_amount')
+
+    def __init__(self, name, price, description, features, amount, currency, billing_period, monthly_amount):
+        self.name = name
+        self.price = price
+        self.description = description
+        self.features = features  # tuple of str
+        self.amount = amount
+        self.currency = currency
+        self.billing_period = billing_period
+        self.monthly_amount = monthly_amount
+
+    @classmethod
+    def from_dict(cls, plan):
+        """Plan for a plan dict, reusing an equal plan seen before"""
+        fields = (
+            _intern(plan.get('name')),
+            _intern(plan.get('price')),
+            _intern(plan.get('description')),
+            _features_of(plan.get('features')),
+            plan.get('amount'),
+            _intern(plan.get('currency')),
+            _intern(plan.get('billing_period')),
+            plan.get('monthly_amount'),
+        )
+        return _shared(_plans, fields, lambda: cls(*fields))
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'price': self.price,
+            'description': self.description,
+            'features': list(self.features),
+            'amount': self.amount,
+            'currency': self.currency,
+            'billing_period': self.billing_period,
+            'monthly_amount': self.monthly_amount,
+        }
+
+
+class PricingData:
+    """Pricing extracted from one page: its plans and the text they came from"""
+
+    __slots__ = ('plans', 'currency', 'billing_period', 'raw_text_extract', 'pricing_mentions')
+
+    def __init__(self, plans, currency, billing_period, raw_text_extract=None, pricing_mentions=None):
+        self.plans = plans  # tuple of Plan
+        self.currency = currency
+        self.billing_period = billing_period
+        self.raw_text_extract = raw_text_extract
+        self.pricing_mentions = pricing_mentions  # tuple of str, generic extractor only
+
+    @classmethod
+    def from_dict(cls, pricing_data):
+        """PricingData for an extractor result or stored JSON, or None for None"""
+        if pricing_data is None:
+            return None
+        plans = pricing_data.get('plans') or []
+        # Snapshots stored before normalization existed are normalized here
+        if plans and 'monthly_amount' not in plans[0]:
+            plans = normalize_plans(pricing_data)['plans']
+        mentions = pricing_data.get('pricing_mentions')
+        return cls(
+            tuple(Plan.from_dict(plan) for plan in plans),
+            _intern(pricing_data.get('currency')),
+            _intern(pricing_data.get('billing_period')),
+            pricing_data.get('raw_text_extract'),
+            tuple(_intern(mention) for mention in mentions) if mentions is not None else None,
+        )
+
+    def to_dict(self):
+        """The JSON shape extractors produce and /api/data serves"""
+        data = {
+            'plans': [plan.to_dict() for plan in self.plans],
+            'currency': self.currency,
+            'billing_period': self.billing_period,
+            'raw_text_extract': self.raw_text_extract,
+        }
+        if self.pricing_mentions is not None:
+            data['pricing_mentions'] = list(self.pricing_mentions)
+        return data
+
+
+class Snapshot:
+    """Result of one scrape of one competitor"""
+
+    __slots__ = ('name', 'url', 'last_updated', 'success', 'pricing_data', 'error', 'source_digest', 'extractor_version')
+
+    def __init__(self, name, url, last_updated, success, pricing_data=None, error=None,
+                 source_digest=None, extractor_version=None):
+        self.name = _intern(name)
+        self.url = _intern(url)
+        self.last_updated = last_updated  # ISO 8601 string
+        self.success = success
+        self.pricing_data = pricing_data  # PricingData or None
+        self.error = error
+        self.source_digest = source_digest  # sha256 of the archived page it was extracted from
+        self.extractor_version = _intern(extractor_version)  # see extractors.extractor_version
+
+    def replace(self, **fields):
+        """Copy of this snapshot with the given fields changed"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(fields)
+        return Snapshot(**values)
+
+    def to_dict(self):
+        """The JSON shape of one competitor in /api/data"""
+        return {
+            'name': self.name,
+            'url': self.url,
+            'last_updated': self.last_updated,
+            'success': self.success,
+            'pricing_data': self.pricing_data.to_dict() if self.pricing_data is not None else None,
+            'error': self.error,
+        }
+
+
+class DataVersion:
+    """One published version of the latest Snapshot of every competitor.
+
+    Never changed once published: writers build the next version and swap
+    the reference, so readers can keep one without locks or copies.
+    """
+
+    __slots__ = ('version', 'snapshots', 'loaded_at')
+
+    def __init__(self, version, snapshots, loaded_at):
+        self.version = version
+        if not isinstance(snapshots, MappingProxyType):
+            snapshots = MappingProxyType(snapshots)
+        self.snapshots = snapshots  # read-only, keyed by competitor
+        self.loaded_at = loaded_at  # monotonic time the data was last read from the database
@@ -0,0 +1,133 @@
+import logging
+import time
+from functools import cached_property, wraps
+
+from bs4 import BeautifulSoup, UnicodeDammit
+import trafilatura
+
+# Prefer a single C-backed lxml tree shared by text extraction and
+# trafilatura; fall back to BeautifulSoup's pure-Python parser
+try:
+    import lxml.html
+    from lxml import etree
+    HTML_PARSER = 'lxml'
+    # Same settings trafilatura uses, so it can work on our tree directly
+    LXML_PARSER = lxml.html.HTMLParser(
+        collect_ids=False, default_doctype=False, encoding='utf-8',
+        remove_comments=True, remove_pis=True,
+    )
+    VISIBLE_TEXT = etree.XPath(
+        '//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]'
+    )
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+
+def _timed(stage):
+    """Add the time a page computation takes, minus nested ones, to page.timings"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(self):
+            outer_nested = self._nested_time
+            self._nested_time = 0.0
+            start = time.perf_counter()
+            try:
+                return func(self)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.timings[stage] = self.timings.get(stage, 0.0) + elapsed - self._nested_time
+                self._nested_time = outer_nested + elapsed
+        return wrapper
+    return decorate
+
+
+class ParsedPage:
+    """A fetched page that is parsed once and shared by every extractor.
+
+    The DOM, the plain text and the trafilatura extract are each computed
+    lazily the first time an extractor asks for them, then reused. The
+    seconds spent on each ('decode', 'tree', 'soup', 'text',
+    'trafilatura') are collected in timings.
+    """
+
+    def __init__(self, content, encoding=None):
+        self.timings = {}
+        self._nested_time = 0.0
+        start = time.perf_counter()
+        # Decode once up front, sniffing the charset when it is not known
+        if isinstance(content, bytes):
+            if encoding:
+                content = content.decode(encoding, errors='replace')
+            else:
+                content = UnicodeDammit(content, is_html=True).unicode_markup or ''
+        self.content = content
+        self.timings['decode'] = time.perf_counter() - start
+
+    @cached_property
+    @_timed('tree')
+    def tree(self):
+        """lxml DOM of the page, or None when lxml is unavailable or fails"""
+        if HTML_PARSER != 'lxml':
+            return None
+        try:
+            try:
+                # Parse the text as is rather than a UTF-8 copy of it
+                return lxml.html.fromstring(self.content, parser=LXML_PARSER)
+            except ValueError:
+                # lxml refuses str input that carries an XML encoding declaration
+                return lxml.html.fromstring(self.content.encode('utf-8'), parser=LXML_PARSER)
+        except (etree.ParserError, ValueError) as e:
+            logging.debug(f"lxml could not parse page: {str(e)}")
+            return None
+
+    @cached_property
+    @_timed('soup')
+    def soup(self):
+        """BeautifulSoup DOM, only built for extractors that need its API"""
+        return BeautifulSoup(self.content, HTML_PARSER)
+
+    @cached_property
+    @_timed('text')
+    def text(self):
+        """Visible text of the page (script and style contents excluded)"""
+        if self.tree is not None:
+            return ''.join(VISIBLE_TEXT(self.tree))
+        return self.soup.get_text()
+
+    @cached_property
+    @_timed('trafilatura')
+    def clean_text(self):
+        """Main content as extracted by trafilatura, or None"""
+        try:
+            # trafilatura copies the tree before cleaning it, so sharing is safe
+            source = self.tree if self.tree is not None else self.content
+            return trafilatura.extract(source) or None
+        except Exception as e:
+            logging.debug(f"trafilatura extraction failed: {str(e)}")
+            return None
+
+    @cached_property
+    def pricing_extract(self):
+        """Get a clean text extract focusing on pricing information"""
+        lines = (line.strip() for line in self.text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        text = ' '.join(chunk for chunk in chunks if chunk)
+
+        # Try to find pricing-related sections
+        pricing_keywords = ['pricing', 'price', 'cost', 'plan', 'subscription', 'billing', 'fee']
+        sentences = text.split('.')
+
+        pricing_sentences = []
+        for sentence in sentences:
+            sentence_lower = sentence.lower()
+            if any(keyword in sentence_lower for keyword in pricing_keywords):
+                pricing_sentences.append(sentence.strip())
+                if len(pricing_sentences) == 5:
+                    break
+
+        if pricing_sentences:
+            extract = '. '.join(pricing_sentences)  # First 5 relevant sentences
+        else:
+            extract = text[:500]  # First 500 characters as fallback
+
+        return extract + '...' if len(extract) > 500 else extract
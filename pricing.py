@@ -0,0 +1,300 @@
+import math
+import re
+from array import array
+
+# Approximate reference rates used to compare plans across currencies.
+# Update these when they drift; they are not meant for accounting.
+EUR_RATES = {
+    'EUR': 1.0,
+    'USD': 0.92,
+    'GBP': 1.17,
+    'SEK': 0.088,
+}
+
+CURRENCY_SYMBOLS = {
+    '$': 'USD',
+    '€': 'EUR',
+    '£': 'GBP',
+}
+
+CURRENCY_WORDS = {
+    'kr': 'SEK',
+    'sek': 'SEK',
+    'usd': 'USD',
+    'eur': 'EUR',
+    'euro': 'EUR',
+    'gbp': 'GBP',
+}
+
+# Words for a billing period, English and Swedish
+PERIOD_WORDS = {
+    'month': 'month',
+    'months': 'month',
+    'mo': 'month',
+    'mon': 'month',
+    'monthly': 'month',
+    'månad': 'month',
+    'månaden': 'month',
+    'mån': 'month',
+    'mnd': 'month',
+    'm': 'month',
+    'year': 'year',
+    'years': 'year',
+    'yr': 'year',
+    'annually': 'year',
+    'yearly': 'year',
+    'år': 'year',
+    'året': 'year',
+}
+
+PERIOD_MONTHS = {'month': 1, 'year': 12}
+
+FREE_WORDS = ('free', 'gratis', 'kostenlos')
+
+# Plan names that mean the same tier at different competitors
+TIER_ALIASES = {
+    'gratis': 'free',
+    'grow': 'growth',
+}
+
+PRICE_RE = re.compile(
+    r'(?P<symbol>[$€£])?\s*'
+    r'(?P<number>\d{1,3}(?:[  ,.]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)'
+    r'\s*(?P<suffix>k\b)?'
+    r'(?:\s*(?P<word>kr|sek|usd|eur|euro|gbp)\b)?',
+    re.IGNORECASE,
+)
+PERIOD_RE = re.compile(r'(?:/|\bper\b|\ba\b|\bi\b)\s*(?P<period>[a-zåäö]+)', re.IGNORECASE)
+
+
+def parse_number(number):
+    """Parse '1,413', '3 950', '1.413,50' or '49.99' into a float"""
+    number = number.replace(' ', ' ')
+    groups = re.split(r'[ ,.]', number)
+    separators = re.findall(r'[ ,.]', number)
+    if not separators:
+        return float(number)
+    # A trailing group of one or two digits is a decimal part
+    if len(groups[-1]) in (1, 2):
+        whole = ''.join(groups[:-1])
+        return float(f"{whole}.{groups[-1]}")
+    return float(''.join(groups))
+
+
+def normalize_price(price, default_currency=None, default_period=None):
+    """Turn a free-text price into amount, currency, period and monthly amount
+
+    Returns a dict with 'amount', 'currency', 'billing_period' and
+    'monthly_amount'. Prices such as 'Custom quote' give None amounts.
+    """
+    result = {
+        'amount': None,
+        'currency': default_currency,
+        'billing_period': default_period,
+        'monthly_amount': None,
+    }
+    if not price:
+        return result
+
+    text = price.strip()
+    lowered = text.lower()
+
+    match = PRICE_RE.search(text)
+    if match is None:
+        if any(word in lowered for word in FREE_WORDS):
+            result['amount'] = 0.0
+            result['monthly_amount'] = 0.0
+        return result
+
+    amount = parse_number(match.group('number'))
+    if match.group('suffix'):
+        amount *= 1000
+
+    if match.group('symbol'):
+        result['currency'] = CURRENCY_SYMBOLS[match.group('symbol')]
+    elif match.group('word'):
+        result['currency'] = CURRENCY_WORDS[match.group('word').lower()]
+
+    period_match = PERIOD_RE.search(text, match.end())
+    if period_match:
+        period = PERIOD_WORDS.get(period_match.group('period').lower())
+        if period:
+            result['billing_period'] = period
+
+    result['amount'] = amount
+    months = PERIOD_MONTHS.get(result['billing_period'])
+    if months:
+        result['monthly_amount'] = round(amount / months, 2)
+    return result
+
+
+def normalize_plans(pricing_data):
+    """Return the pricing data with normalized price fields added to every plan"""
+    if not pricing_data or not pricing_data.get('plans'):
+        return pricing_data
+
+    currency = pricing_data.get('currency')
+    if currency == 'Unknown':
+        currency = None
+    period = {'monthly': 'month', 'yearly': 'year'}.get(pricing_data.get('billing_period'))
+
+    plans = []
+    for plan in pricing_data['plans']:
+        # Build new dicts; extractors may hand out shared plan definitions
+        plans.append({**plan, **normalize_price(plan.get('price'), currency, period)})
+    return {**pricing_data, 'plans': plans}
+
+
+def tier_of(plan_name):
+    """Normalized tier name used to line plans up across competitors"""
+    tier = (plan_name or '').strip().lower()
+    return TIER_ALIASES.get(tier, tier)
+
+
+class _Codes:
+    """Dictionary encoding of a string column"""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def code(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class PlanTable:
+    """Columnar table of normalized plans across competitors.
+
+    String columns are dictionary-encoded into integer arrays and numeric
+    columns are float arrays (NaN for unknown), so filters and comparisons
+    compare small integers and floats instead of re-parsing price text.
+
+    The filters are plain loops over the rows still matching, not
+    vectorized: numpy is deliberately not a dependency, and for the few
+    thousand plans a dashboard holds, map()/itertools.compress masks
+    measured no faster than these comprehensions.
+    """
+
+    def __init__(self, eur_rates=None):
+        self.eur_rates = eur_rates or EUR_RATES
+        self._competitors = _Codes()
+        self._tiers = _Codes()
+        self._currencies = _Codes()
+        self._periods = _Codes()
+        self.competitor = array('I')
+        self.tier = array('I')
+        self.currency = array('I')
+        self.period = array('I')
+        self.amount = array('d')
+        self.monthly = array('d')
+        self.monthly_eur = array('d')
+        self.names = []
+        self.prices = []
+
+    @classmethod
+    def from_data(cls, data, eur_rates=None):
+        """Build a table from the latest Snapshot of every competitor"""
+        table = cls(eur_rates)
+        for competitor_key, snapshot in data.items():
+            pricing = snapshot.pricing_data if snapshot else None
+            if not pricing or not snapshot.success:
+                continue
+            for plan in pricing.plans:
+                table.append(competitor_key, plan)
+        return table
+
+    def append(self, competitor_key, plan):
+        """Add one normalized Plan as a row"""
+        amount = plan.amount
+        monthly = plan.monthly_amount
+        currency = plan.currency
+        rate = self.eur_rates.get(currency)
+
+        self.competitor.append(self._competitors.code(competitor_key))
+        self.tier.append(self._tiers.code(tier_of(plan.name)))
+        self.currency.append(self._currencies.code(currency))
+        self.period.append(self._periods.code(plan.billing_period))
+        self.amount.append(math.nan if amount is None else amount)
+        self.monthly.append(math.nan if monthly is None else monthly)
+        if monthly == 0:
+            monthly_eur = 0.0  # free is free in any currency
+        elif monthly is None or rate is None:
+            monthly_eur = math.nan
+        else:
+            monthly_eur = monthly * rate
+        self.monthly_eur.append(monthly_eur)
+        self.names.append(plan.name)
+        self.prices.append(plan.price)
+
+    def __len__(self):
+        return len(self.amount)
+
+    def select(self, competitor=None, tier=None, currency=None, max_monthly_eur=None, priced_only=False):
+        """Row indices matching every given filter"""
+        rows = range(len(self))
+        if competitor is not None:
+            code = self._competitors.index.get(competitor)
+            column = self.competitor
+            rows = [i for i in rows if column[i] == code]
+        if tier is not None:
+            code = self._tiers.index.get(tier_of(tier))
+            column = self.tier
+            rows = [i for i in rows if column[i] == code]
+        if currency is not None:
+            code = self._currencies.index.get(currency)
+            column = self.currency
+            rows = [i for i in rows if column[i] == code]
+        if priced_only or max_monthly_eur is not None:
+            column = self.monthly_eur
+            limit = math.inf if max_monthly_eur is None else max_monthly_eur
+            # NaN compares false, so unpriced plans drop out here
+            rows = [i for i in rows if column[i] <= limit]
+        return list(rows)
+
+    def cheapest_per_tier(self, currency='EUR'):
+        """Cheapest priced plan of every tier, with its monthly price in currency"""
+        rate = self.eur_rates.get(currency)
+        if not rate:
+            raise ValueError(f"No exchange rate for {currency}")
+
+        best = {}
+        column = self.monthly_eur
+        for i in self.select(priced_only=True):
+            tier = self.tier[i]
+            if tier not in best or column[i] < column[best[tier]]:
+                best[tier] = i
+        return {
+            self._tiers.values[tier]: {
+                **self.row(i),
+                'monthly_in_currency': round(column[i] / rate, 2),
+                'comparison_currency': currency,
+            }
+            for tier, i in best.items()
+        }
+
+    def row(self, i):
+        """Row i as a dict"""
+        def number(value):
+            return None if math.isnan(value) else round(value, 2)
+
+        return {
+            'competitor': self._competitors.values[self.competitor[i]],
+            'name': self.names[i],
+            'tier': self._tiers.values[self.tier[i]],
+            'price': self.prices[i],
+            'amount': number(self.amount[i]),
+            'currency': self._currencies.values[self.currency[i]],
+            'billing_period': self._periods.values[self.period[i]],
+            'monthly_amount': number(self.monthly[i]),
+            'monthly_amount_eur': number(self.monthly_eur[i]),
+        }
+
+    def rows(self, indices=None):
+        """Rows as dicts, all of them by default"""
+        if indices is None:
+            indices = range(len(self))
+        return [self.row(i) for i in indices]
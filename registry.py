@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from collections.abc import MutableMapping
+
+# One JSON object per line, so large lists are read a line at a time
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "competitors.jsonl")
+
+
+def parse_shard(value):
+    """Parse 'index/count' (e.g. '2/8') into (index, count)"""
+    index, count = (int(part) for part in value.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}: index must be in 0..{count - 1}")
+    return index, count
+
+
+def shard_of(key, count):
+    """Shard a competitor key belongs to; stable across processes and restarts"""
+    return zlib.crc32(key.encode("utf-8")) % count
+
+
+class CompetitorRegistry(MutableMapping):
+    """Competitors to scrape, read from a JSON lines file on first use.
+
+    Each line is one competitor:
+
+        key                      unique id, used in URLs and storage
+        name, url                display name and pricing page
+        candidate_urls           fallback URLs tried in order when url fails
+        encoding                 charset to decode with instead of sniffing
+        cutoff_marker            text after which the rest of the page is not downloaded
+        headers                  extra request headers
+        forbidden_retry_headers  headers for one retry after a 403
+        extractor                'spec:<name>' or 'generic' (see extractors.py)
+        enabled                  false to keep an entry without scraping it
+
+    With a shard (index, count), only the entries whose key hashes to that
+    shard are kept, so each of several processes owns part of a long list.
+    """
+
+    def __init__(self, path=None, shard=None):
+        self.path = path or os.environ.get("PRICESCRAPE_COMPETITORS", DEFAULT_REGISTRY_PATH)
+        if shard is None and os.environ.get("PRICESCRAPE_SHARD"):
+            shard = parse_shard(os.environ["PRICESCRAPE_SHARD"])
+        self.shard = shard
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    def _load(self):
+        entries = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    entry = json.loads(line)
+                    key = entry["key"]
+                except (ValueError, KeyError) as e:
+                    logging.error(f"Skipping invalid competitor on line {line_number} of {self.path}: {str(e)}")
+                    continue
+                if not entry.get("enabled", True):
+                    continue
+                if self.shard and shard_of(key, self.shard[1]) != self.shard[0]:
+                    continue
+                entry.setdefault("name", key)
+                entry.setdefault("extractor", "generic")
+                entries[key] = entry
+        shard = f" (shard {self.shard[0]}/{self.shard[1]})" if self.shard else ""
+        logging.info(f"Loaded {len(entries)} competitors from {self.path}{shard}")
+        return entries
+
+    def reload(self):
+        """Forget the loaded entries, so the file is read again on next use"""
+        with self._lock:
+            self._entries = None
+
+    def __getitem__(self, key):
+        return self.entries[key]
+
+    def __setitem__(self, key, entry):
+        self.entries[key] = entry
+
+    def __delitem__(self, key):
+        del self.entries[key]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
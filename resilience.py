@@ -0,0 +1,141 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    A host's circuit opens after failure_threshold consecutive failures,
+    and requests to it are refused without touching the network for a
+    cooldown. Then one probe request is let through (half-open): success
+    closes the circuit, failure opens it again with a doubled cooldown, up
+    to max_cooldown. Every check is a dict lookup under one lock, so
+    refusing requests stays cheap however many hosts are down.
+    """
+
+    def __init__(self, failure_threshold=3, cooldown=60, max_cooldown=900):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown  # seconds a circuit stays open at first
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def allow(self, host):
+        """Whether a request to host may be sent now"""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state['state'] == CLOSED:
+                return True
+            if state['state'] == OPEN and time.monotonic() >= state['retry_at']:
+                # Cooldown over: let exactly one probe through
+                state['state'] = HALF_OPEN
+                logging.info(f"Circuit for {host} half-open; probing")
+                return True
+            return False
+
+    def record_success(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                return
+            if state['state'] != CLOSED:
+                logging.info(f"Circuit for {host} closed")
+            del self._hosts[host]
+
+    def record_failure(self, host):
+        with self._lock:
+            state = self._hosts.setdefault(host, {'state': CLOSED, 'failures': 0, 'cooldown': self.cooldown, 'retry_at': 0})
+            state['failures'] += 1
+            if state['state'] == HALF_OPEN:
+                # The probe failed; back off longer before the next one
+                state['cooldown'] = min(state['cooldown'] * 2, self.max_cooldown)
+            elif state['failures'] < self.failure_threshold:
+                return
+            state['state'] = OPEN
+            state['retry_at'] = time.monotonic() + state['cooldown']
+            logging.warning(f"Circuit for {host} open for {state['cooldown']}s after {state['failures']} failures")
+
+    def release_probe(self, host):
+        """Give up a half-open probe that ended without an outcome, e.g. when abandoned
+
+        The circuit goes back to open with its cooldown already over, so
+        the next request becomes the probe instead.
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None and state['state'] == HALF_OPEN:
+                state['state'] = OPEN
+                state['retry_at'] = time.monotonic()
+
+    def state(self, host):
+        """'closed', 'open' or 'half_open'"""
+        with self._lock:
+            state = self._hosts.get(host)
+            return state['state'] if state else CLOSED
+
+    def states(self):
+        """State of every host that has failed recently"""
+        with self._lock:
+            return {host: state['state'] for host, state in self._hosts.items()}
+
+
+class LatencyTracker:
+    """Recent response latencies per host, used to pick adaptive timeouts.
+
+    A host's timeout is a high percentile of its recent latencies times a
+    safety multiplier, clamped to [min_timeout, max_timeout]. Hosts with
+    too few samples get default_timeout.
+    """
+
+    def __init__(self, window=50, percentile=0.95, multiplier=3.0, min_samples=5,
+                 min_timeout=5.0, max_timeout=30.0, default_timeout=30.0):
+        self.window = window
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._quantiles = {}
+        self._timeouts = {}
+
+    def observe(self, host, seconds):
+        """Record how long host took to answer"""
+        with self._lock:
+            samples = self._samples.get(host)
+            if samples is None:
+                samples = self._samples[host] = deque(maxlen=self.window)
+            samples.append(seconds)
+            if len(samples) >= self.min_samples:
+                ordered = sorted(samples)
+                value = ordered[min(math.ceil(self.percentile * len(ordered)) - 1, len(ordered) - 1)]
+                self._quantiles[host] = value
+                self._timeouts[host] = min(max(value * self.multiplier, self.min_timeout), self.max_timeout)
+
+    def quantile(self, host):
+        """Recent latency percentile of host in seconds, or None without enough samples"""
+        return self._quantiles.get(host)
+
+    def timeout_for(self, host):
+        """Timeout in seconds for the next request to host"""
+        return self._timeouts.get(host, self.default_timeout)
+
+    def timeouts(self):
+        """Current adaptive timeout of every host with enough samples"""
+        with self._lock:
+            return dict(self._timeouts)
@@ -1,42 +1,70 @@
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
+import os
 import time
 import logging
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-import re
 from urllib.parse import urljoin, urlparse
-import trafilatura
 
-class CompetitorScraper:
-    def __init__(self):
-        self.competitors = {
-            'bolago': {
-                'url': 'https://bolago.com/se/priser/',
-                'name': 'Bolago'
-            },
-            'nvr': {
-                'url': 'https://www.nvr.se/pris',
-                'name': 'NVR'
-            },
-            'ledgy': {
-                'url': 'https://ledgy.com/company-pricing',
-                'name': 'Ledgy'
-            },
-            'cakeequity': {
-                'url': 'https://www.cakeequity.com/pricing',
-                'name': 'Cake Equity'
-            },
-            'mantle': {
-                'url': 'https://withmantle.com/pricing',
-                'name': 'Mantle'
-            },
+from archive import PageArchive
+from http_client import HttpClient, RequestHandle, read_body
+from extraction import ExtractionPool
+from extractors import GenericExtractor, extractor_version
+from leases import LeaseTimeout, RefreshLeases
+from metrics import (
+    EXTRACTOR_FALLBACKS, HTTP_RESPONSE_BYTES, HTTP_RESPONSES, HTTP_RETRIES,
+    SCRAPE_SECONDS, SCRAPE_STAGE_SECONDS, SCRAPES,
+)
+from models import PricingData, Snapshot
+from pricing import PlanTable, tier_of
+from registry import CompetitorRegistry
+from storage import PricingStore
 
-        }
+# Plan fields returned by get_history; descriptions and features are left out
+HISTORY_PLAN_FIELDS = ('name', 'price', 'amount', 'currency', 'billing_period', 'monthly_amount')
+
+# Pages of snapshots get_history reads at most per call when filtering by plan
+HISTORY_SCAN_PAGES = 10
+
+
+def _in_thread(fn, *args):
+    """Run fn(*args) on a daemon thread of its own; returns a Future of its result"""
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge", daemon=True).start()
+    return future
+
+
+def _close_abandoned(future):
+    """Release the connection of a hedged request whose answer came too late"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class CompetitorScraper:
+    def __init__(self, registry=None):
+        # Competitors come from competitors.jsonl (or PRICESCRAPE_COMPETITORS),
+        # read on first use and optionally limited to a shard
+        self.competitors = registry if registry is not None else CompetitorRegistry()
+        
+        # Persistent pricing history; the latest snapshot per competitor is cached
+        self.store = PricingStore()
         
-        # In-memory storage for scraped data
-        self.data = {}
+        # Every distinct page body fetched, for re-extracting past pages later
+        self.archive = PageArchive(self.store)
+        
+        # Only one refresh per competitor at a time, across all processes
+        self.leases = RefreshLeases()
         
         # Request headers to appear more like a real browser
         self.headers = {
@@ -52,16 +80,98 @@ class CompetitorScraper:
             'Cache-Control': 'max-age=0'
         }
         
-        # Rate limiting - wait between requests
+        # Rate limiting - minimum gap between requests to the same host
         self.request_delay = 2  # seconds
+        self._host_lock = threading.Lock()
+        self._host_next_slot = {}
+        
+        # Fallback extractor for competitors without a spec; stops scanning
+        # once it has this many price mentions and plans
+        self.generic_extractor = GenericExtractor(max_mentions=10, max_plans=12)
+        
+        # Parsing and extraction run in this many worker processes, so they
+        # do not hold the GIL of the web process; 0 runs them inline
+        self.extraction = ExtractionPool(int(os.environ.get('PRICESCRAPE_PARSE_WORKERS', '0')))
+        
+        # Columnar view of the latest plans, rebuilt when the data changes
+        self._plan_table = None
+        self._plan_table_source = None
+        
+        # Competitors are fetched concurrently, each on its own worker thread
+        self.max_workers = 8
+        self._data_lock = threading.Lock()
+        
+        # Results of the scrape_all runs in progress, by run id, written
+        # together when the run ends
+        self._run_batches = {}
+        
+        # Competitors with fallback URLs start the next one when the current
+        # one has not answered within the host's usual latency (at most
+        # hedge_delay seconds); the first good response wins. Each request
+        # runs on a daemon thread of its own, and the losers are aborted.
+        self.hedge_delay = 2.0
+        
+        # Page bodies are streamed and cut off at this size
+        self.max_body_bytes = 5 * 1024 * 1024
+        
+        # One pooled client for every scrape, so connections stay warm
+        self.http = HttpClient(
+            headers={
+                **self.headers,
+                # Add a neutral referer; some sites block requests without one
+                "Referer": "https://www.google.com/",
+                # Bias to UK English for the Carta URL we target
+                "Accept-Language": "en-GB,en;q=0.9,sv;q=0.8",
+            },
+            pool_maxsize=4,
+            idle_timeout=300,
+        )
         
         logging.info("CompetitorScraper initialized")
 
-    def scrape_single(self, competitor_key):
-        """Scrape data for a single competitor"""
+    def scrape_single(self, competitor_key, run_id=None):
+        """Scrape data for a single competitor
+
+        Holds the competitor's refresh lease while scraping, so a refresh
+        already running in another thread or worker process is waited for,
+        and its result is returned instead of crawling the site again. The
+        result is stored under run_id, or a run of its own.
+        """
         if competitor_key not in self.competitors:
             return {'success': False, 'error': f'Unknown competitor: {competitor_key}'}
         
+        started = time.perf_counter()
+        requested_at = datetime.now()
+        try:
+            with self.leases.hold(competitor_key) as lease:
+                # Attach to the refresh we waited for. Its result comes through
+                # the lease, since its run may not have been stored yet.
+                attached = lease.result
+                if attached and datetime.fromisoformat(attached['finished']) >= requested_at:
+                    logging.info(f"Using the result of the concurrent refresh of {competitor_key}")
+                    self._observe_scrape(competitor_key, 'attached', started)
+                    return {
+                        'success': attached['success'],
+                        'data': PricingData.from_dict(attached['pricing_data']),
+                        'error': attached['error'],
+                        'attached': True,
+                    }
+                result = self._scrape(competitor_key, run_id or uuid.uuid4().hex, started)
+                data = result.get('data')
+                lease.publish({
+                    'finished': datetime.now().isoformat(),
+                    'success': result['success'],
+                    'pricing_data': data.to_dict() if data is not None else None,
+                    'error': result.get('error'),
+                })
+                return result
+        except LeaseTimeout as e:
+            logging.error(str(e))
+            self._observe_scrape(competitor_key, 'failed', started)
+            return {'success': False, 'error': str(e)}
+
+    def _scrape(self, competitor_key, run_id, started):
+        """Fetch, parse and store one competitor while holding its lease"""
         competitor = self.competitors[competitor_key]
         url = competitor['url']
         name = competitor['name']
@@ -69,99 +179,68 @@ class CompetitorScraper:
         print(f"Scraping {name}...")
         logging.info(f"Scraping {name} at {url}")
         
+        # Previous successful result, reused when the page has not changed;
+        # read from the database, since another worker may have written it
+        previous = self.store.latest_entry(competitor_key)
+        if previous and not (previous.success and previous.pricing_data):
+            previous = None
+        
         try:
-            # Rate limiting
-            time.sleep(self.request_delay)
+            # Some sites block certain paths, so the registry can list fallbacks;
+            # use whichever candidate answers first
+            candidate_urls = [url, *competitor.get('candidate_urls', [])]
+            url, response = self._fetch_first(competitor_key, competitor, candidate_urls, previous)
             
-            # Make request with session, retries and better error handling
-            session = requests.Session()
-
-            # Retry strategy for transient errors
-            retry = Retry(
-                total=3,
-                backoff_factor=1.0,
-                status_forcelist=[429, 500, 502, 503, 504],
-                allowed_methods={"GET", "HEAD"},
-            )
-            adapter = HTTPAdapter(max_retries=retry)
-            session.mount("http://", adapter)
-            session.mount("https://", adapter)
-
-            # Start with our default browser-like headers
-            session.headers.update({
-                **self.headers,
-                # Add a neutral referer; some sites block requests without one
-                "Referer": "https://www.google.com/",
-                # Bias to UK English for the Carta URL we target
-                "Accept-Language": "en-GB,en;q=0.9,sv;q=0.8",
-            })
-
-            # Prepare candidate URLs (Carta sometimes blocks certain regional paths)
-            candidate_urls = [url]
-            if "carta.com" in url:
-                candidate_urls = [
-                    url,
-                    # try non-regional path
-                    "https://carta.com/en/plans/pricing-for-companies/",
-                    # try generic pricing landing
-                    "https://carta.com/pricing/",
-                ]
-
-            last_exc = None
-            response = None
-            for candidate in candidate_urls:
-                try:
-                    logging.debug(f"Requesting {name} at {candidate} with session headers")
-                    response = session.get(candidate, timeout=30, allow_redirects=True, verify=True)
-
-                    # If explicitly forbidden, try a slightly different UA/headers once
-                    if response.status_code == 403 and "carta.com" in candidate:
-                        logging.warning("403 returned; retrying Carta with alternate headers")
-                        alt_headers = {
-                            # A newer Chrome UA sometimes helps
-                            "User-Agent": (
-                                "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_4) "
-                                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                                "Chrome/124.0.0.0 Safari/537.36"
-                            ),
-                            # Simplify Accept to look more like a real nav request
-                            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-                            "Referer": "https://www.google.com/",
-                        }
-                        response = session.get(candidate, headers=alt_headers, timeout=30, allow_redirects=True, verify=True)
-
-                    response.raise_for_status()
-                    url = candidate  # use the successful candidate for downstream parsing
-                    break
-                except requests.RequestException as ex:
-                    last_exc = ex
-                    logging.warning(f"Fetch failed for {candidate}: {ex}")
-                    response = None
-                    continue
-
-            if response is None:
-                raise last_exc if last_exc else requests.RequestException("Failed to fetch page")
+            # Skip parsing entirely when the server or the body hash says nothing changed
+            if response.status_code == 304 and previous:
+                response.close()
+                logging.info(f"{name} not modified (304); keeping previous pricing data")
+                self._observe_scrape(competitor_key, 'unchanged', started)
+                return self._store_unchanged(competitor_key, run_id, previous, url)
             
-            # Handle encoding issues for Swedish sites like Bolago
-            if 'bolago.com' in url or 'nvr.se' in url:
-                response.encoding = 'utf-8'
+            # Read the body in chunks, decoding, hashing and archiving as it
+            # arrives. Sites that misreport their charset set an encoding in
+            # the registry; a cutoff_marker stops the download once the
+            # pricing section is in.
+            cutoff = competitor.get('cutoff_marker')
+            writer = self.archive.writer()
+            try:
+                body = read_body(
+                    response, self.max_body_bytes, competitor.get('encoding'),
+                    cutoff.encode('utf-8') if cutoff else None, writer,
+                )
+            except Exception:
+                writer.discard()
+                raise
+            self._archive_page(competitor_key, url, writer, body)
+            SCRAPE_STAGE_SECONDS.labels(competitor_key, 'download').observe(body.elapsed)
+            HTTP_RESPONSE_BYTES.labels(competitor_key).inc(body.size)
             
-            # Parse HTML
-            soup = BeautifulSoup(response.content, 'html.parser')
+            body_hash = body.digest
+            last_hash = (self.store.get_validators(url) or {}).get('body_hash')
+            self._remember_validators(url, response, body_hash)
+            # A page extracted by an older extractor is extracted again
+            version = extractor_version(competitor['extractor'])
+            if previous and previous.url == url and body_hash == last_hash and previous.extractor_version == version:
+                logging.info(f"{name} page unchanged (same body hash); keeping previous pricing data")
+                self._observe_scrape(competitor_key, 'unchanged', started)
+                return self._store_unchanged(competitor_key, run_id, previous, url)
             
-            # Extract pricing information based on competitor
-            pricing_data = self._extract_pricing_data(competitor_key, soup, response.text)
+            # Parse HTML once and extract the normalized pricing data; only
+            # the body goes to the extraction pool and only the result returns
+            pricing_data, info = self.extraction.extract(
+                competitor['extractor'], body.content, body.encoding, self.generic_extractor,
+            )
+            self._observe_extraction(competitor_key, info)
             
-            # Store the data
-            self.data[competitor_key] = {
-                'name': name,
-                'url': url,
-                'last_updated': datetime.now().isoformat(),
-                'success': True,
-                'pricing_data': pricing_data,
-                'error': None
-            }
+            # Store the data as a compact record sharing plans with earlier scrapes
+            pricing_data = PricingData.from_dict(pricing_data)
+            self._store_result(competitor_key, run_id, Snapshot(
+                name, url, datetime.now().isoformat(), True, pricing_data,
+                source_digest=body.digest, extractor_version=version,
+            ))
             
+            self._observe_scrape(competitor_key, 'success', started)
             print(f"{name} scraping successful!")
             logging.info(f"Successfully scraped {name}")
             return {'success': True, 'data': pricing_data}
@@ -170,464 +249,340 @@ class CompetitorScraper:
             error_msg = f"Request failed for {name}: {str(e)}"
             logging.error(error_msg)
             
-            self.data[competitor_key] = {
-                'name': name,
-                'url': url,
-                'last_updated': datetime.now().isoformat(),
-                'success': False,
-                'pricing_data': None,
-                'error': error_msg
-            }
+            self._store_result(competitor_key, run_id, Snapshot(
+                name, url, datetime.now().isoformat(), False, error=error_msg,
+            ))
             
+            self._observe_scrape(competitor_key, 'failed', started)
             return {'success': False, 'error': error_msg}
             
         except Exception as e:
             error_msg = f"Parsing failed for {name}: {str(e)}"
             logging.error(error_msg)
             
-            self.data[competitor_key] = {
-                'name': name,
-                'url': url,
-                'last_updated': datetime.now().isoformat(),
-                'success': False,
-                'pricing_data': None,
-                'error': error_msg
-            }
+            self._store_result(competitor_key, run_id, Snapshot(
+                name, url, datetime.now().isoformat(), False, error=error_msg,
+            ))
             
+            self._observe_scrape(competitor_key, 'failed', started)
             return {'success': False, 'error': error_msg}
 
-    def _extract_pricing_data(self, competitor_key, soup, raw_html):
-        """Extract pricing information based on the competitor"""
-        
-        if competitor_key == 'carta':
-            return self._extract_carta_pricing(soup)
-        elif competitor_key == 'bolago':
-            return self._extract_bolago_pricing(soup)
-        elif competitor_key == 'nvr':
-            return self._extract_nvr_pricing(soup)
-        elif competitor_key == 'ledgy':
-            return self._extract_ledgy_pricing(soup)
-        elif competitor_key == 'cakeequity':
-            return self._extract_cakeequity_pricing(soup)
-        elif competitor_key == 'mantle':
-            return self._extract_mantle_pricing(soup)
-
-        else:
-            # Fallback: extract general pricing information
-            return self._extract_generic_pricing(soup, raw_html)
-
-    def _extract_carta_pricing(self, soup):
-        """Extract Carta pricing information"""
-        plans = []
-        
-        # Look for pricing plan sections
-        plan_elements = soup.find_all(['div', 'section'], class_=re.compile(r'plan|pricing|card', re.I))
-        
-        # Also try to find text content that looks like pricing
-        text_content = soup.get_text()
-        
-        # Extract plan information from the actual content we know exists
-        if "Raise" in text_content:
-            plans.append({
-                'name': 'Raise',
-                'price': '£21/month',
-                'description': 'Up to five stakeholders (£250/year)',
-                'features': ['Cap table management', 'Advance Assurance', 'Round modelling']
-            })
-        
-        if "Build" in text_content:
-            plans.append({
-                'name': 'Build',
-                'price': 'Contact for pricing',
-                'description': 'Ideal for early-stage startups',
-                'features': ['Everything in Raise', 'Round closing', 'S/EIS']
-            })
-        
-        if "Grow" in text_content:
-            plans.append({
-                'name': 'Grow',
-                'price': 'Contact for pricing',
-                'description': 'Essentials for growing companies',
-                'features': ['Everything in Build', 'EMI & CSOP valuations', 'EMI share plans']
-            })
-        
-        if "Scale" in text_content:
-            plans.append({
-                'name': 'Scale',
-                'price': 'Contact for pricing',
-                'description': 'Features for scaling businesses',
-                'features': ['Everything in Grow', '409A & growth share valuations', 'Compensation management']
-            })
-        
-        return {
-            'plans': plans,
-            'currency': 'GBP',
-            'billing_period': 'monthly',
-            'raw_text_extract': self._get_pricing_text_extract(soup)
-        }
+    def _conditional_headers(self, url, previous, version):
+        """Build If-None-Match/If-Modified-Since headers for a URL we have data for"""
+        validators = self.store.get_validators(url)
+        # A 304 is only useful if we still hold the result parsed from this
+        # URL, by the current extractor version
+        if not validators or not previous or previous.url != url or previous.extractor_version != version:
+            return {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
 
-    def _extract_bolago_pricing(self, soup):
-        """Extract Bolago pricing information"""
-        plans = []
-        
-        # Use trafilatura for better text extraction with Swedish content
+    def _remember_validators(self, url, response, body_hash):
+        """Remember the cache validators of a successful fetch"""
+        self.store.set_validators(
+            url,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            body_hash,
+        )
+
+    def _archive_page(self, competitor_key, url, writer, body):
+        """Keep the raw body of a fetch in the page archive"""
         try:
-            import trafilatura
-            html_content = str(soup)
-            clean_text = trafilatura.extract(html_content)
-            if clean_text:
-                text_content = clean_text
-            else:
-                text_content = soup.get_text()
-        except:
-            text_content = soup.get_text()
-        
-        # Known Bolago pricing structure - try multiple patterns
-        pricing_patterns = [
-            # Free plan
-            {"name": "Gratis", "price": "0 kr/month", "description": "Basic plan, always free", 
-             "features": ["Cap table (up to 5 shareholders)", "Access to legal templates", "Basic reporting"]},
-            
-            # Starter plan
-            {"name": "Starter", "price": "329 kr/month", "description": "Monthly subscription (3,950 kr/year)", 
-             "features": ["Cap table (up to 15 shareholders)", "Up to 2 users", "Document management", "E-Signature"]},
-            
-            # Grow plan  
-            {"name": "Grow", "price": "1,413 kr/month", "description": "Monthly subscription (16,950 kr/year)",
-             "features": ["Cap table (up to 25 shareholders)", "Board portal", "General meetings", "Option programs"]},
-            
-            # Pro plan
-            {"name": "Pro", "price": "Custom quote", "description": "12-month commitment", 
-             "features": ["Unlimited users", "Custom setups", "Legal consulting support"]}
-        ]
-        
-        # Look for pricing indicators in the text
-        text_lower = text_content.lower() if text_content else ""
-        
-        # Add plans based on what we can find
-        if "gratis" in text_lower or "free" in text_lower:
-            plans.append(pricing_patterns[0])
-            
-        if "starter" in text_lower and ("395" in text_content or "3950" in text_content or "3 950" in text_content):
-            plans.append(pricing_patterns[1])
-            
-        if "grow" in text_lower and ("1695" in text_content or "16950" in text_content or "16 950" in text_content):
-            plans.append(pricing_patterns[2])
-            
-        if "pro" in text_lower or "enterprise" in text_lower:
-            plans.append(pricing_patterns[3])
-        
-        # If no specific plans found, add all known plans
-        if not plans:
-            plans = pricing_patterns
-        
-        return {
-            'plans': plans,
-            'currency': 'SEK',
-            'billing_period': 'monthly',
-            'raw_text_extract': text_content[:500] if text_content else "No clean text extracted"
-        }
+            self.archive.add(competitor_key, url, writer, body.digest, body.size, body.encoding)
+        except Exception as e:
+            writer.discard()
+            logging.warning(f"Could not archive page of {competitor_key}: {str(e)}")
 
-    def _extract_nvr_pricing(self, soup):
-        """Extract NVR pricing information"""
-        plans = []
-        text_content = soup.get_text()
-        
-        if "Basic" in text_content and "0 kr/månad" in text_content:
-            plans.append({
-                'name': 'Basic',
-                'price': '0 kr/månad',
-                'description': 'För bolag med få aktieägare och förändringar',
-                'features': ['Digital aktiebok', 'Aktiebok som PDF', 'Investor relations', 'Synk med Skatteverket']
-            })
-        
-        if "Starter" in text_content and "49 kr/månad" in text_content:
-            plans.append({
-                'name': 'Starter',
-                'price': 'Från 49 kr/månad',
-                'description': 'Betala per aktieägare',
-                'features': ['Kategorisering av aktieägare', 'Översiktssida med statistik', 'Rapporter i PDF och Excel']
-            })
-        
-        if "Pro" in text_content and "750 kr/månad" in text_content:
-            plans.append({
-                'name': 'Pro',
-                'price': 'Från 750 kr/månad',
-                'description': 'Betala per stakeholder',
-                'features': ['Optioner och derivat', 'Avancerade överlåtelser', 'Prioriterad support']
-            })
-        
-        return {
-            'plans': plans,
-            'currency': 'SEK',
-            'billing_period': 'monthly',
-            'raw_text_extract': self._get_pricing_text_extract(soup)
-        }
+    def _store_unchanged(self, competitor_key, run_id, previous, url):
+        """Keep the previous pricing data, only refreshing its timestamp"""
+        self._store_result(competitor_key, run_id, previous.replace(
+            url=url,
+            last_updated=datetime.now().isoformat(),
+        ))
+        return {'success': True, 'data': previous.pricing_data, 'unchanged': True}
 
-    def _extract_ledgy_pricing(self, soup):
-        """Extract Ledgy pricing information"""
-        plans = []
-        text_content = soup.get_text()
-        
-        if "Growth" in text_content and "€900/year" in text_content:
-            plans.append({
-                'name': 'Growth',
-                'price': '€75/month',
-                'description': '25 to 50 stakeholders included (€900/year)',
-                'features': ['Cap Table Management', 'Document templating', 'Employee dashboards', 'Custom reporting']
-            })
-        
-        if "Scale" in text_content and "€3k/year" in text_content:
-            plans.append({
-                'name': 'Scale',
-                'price': '€250/month',
-                'description': '50+ stakeholders included (€3k/year)',
-                'features': ['70+ HRIS integrations', 'Exit waterfall modeling', 'Automated granting', 'Onboarding Consultant']
-            })
-        
-        if "Enterprise" in text_content:
-            plans.append({
-                'name': 'Enterprise',
-                'price': 'Custom pricing',
-                'description': '200+ stakeholders included',
-                'features': ['GraphQL API access', 'SAML SSO', 'SCIM provisioning', 'IPO preparation']
-            })
-        
-        return {
-            'plans': plans,
-            'currency': 'EUR',
-            'billing_period': 'monthly',
-            'raw_text_extract': self._get_pricing_text_extract(soup)
-        }
+    def _fetch_first(self, competitor_key, competitor, candidate_urls, previous):
+        """Fetch the first candidate URL to answer successfully, hedging slow ones
 
-    def _extract_cakeequity_pricing(self, soup):
-        """Extract Cake Equity pricing information"""
-        plans = []
-        text_content = soup.get_text()
-        
-        # Based on actual Cake Equity pricing structure
-        plans.append({
-            'name': 'Free',
-            'price': 'Free',
-            'description': '5 stakeholders included',
-            'features': ['Cap table management', 'Stock options & SAFE notes', 'Shareholder access']
-        })
-        
-        plans.append({
-            'name': 'Starter',
-            'price': '$40/month',
-            'description': '30 stakeholders + $3 per additional',
-            'features': ['Cap table management', 'Shareholder vesting', 'Digital signing', 'Scenario modelling']
-        })
-        
-        plans.append({
-            'name': 'Growth',
-            'price': '$80/month',
-            'description': '30 stakeholders + $5 per additional',
-            'features': ['All Starter features', 'Stock Options & RSUs', 'Legal templates', 'Team equity benchmarks']
-        })
-        
-        plans.append({
-            'name': 'Pro',
-            'price': 'Custom pricing',
-            'description': 'Large cap tables with discounted rates',
-            'features': ['409A Valuation', 'IFRS 2 compliance', 'International options', 'Priority support']
-        })
-        
-        return {
-            'plans': plans,
-            'currency': 'USD',
-            'billing_period': 'monthly',
-            'raw_text_extract': self._get_pricing_text_extract(soup)
-        }
+        The first candidate is requested right away. Whenever no request has
+        finished within the latency budget, or one has failed, the next
+        candidate is started as well. The first successful response is
+        returned as (url, response); requests still in flight are aborted
+        (their connections shut down, no more retries) and any responses
+        that still arrive are closed. Raises the last error if all fail.
+        """
+        if len(candidate_urls) == 1:
+            return candidate_urls[0], self._fetch_candidate(competitor_key, competitor, candidate_urls[0], previous)
 
-    def _extract_mantle_pricing(self, soup):
-        """Extract Mantle pricing information"""
-        plans = []
-        text_content = soup.get_text()
-        
-        # Mantle known pricing structure: Free, $100/month ($1200/year), $250/month ($3000/year)
-        
-        # Free plan
-        if "free" in text_content.lower():
-            plans.append({
-                'name': 'Free',
-                'price': 'Free',
-                'description': 'Basic equity management',
-                'features': ['Cap table management', 'Basic reporting']
-            })
-        
-        # Look for yearly pricing and convert to monthly
-        if "1200" in text_content or "$1,200" in text_content:
-            plans.append({
-                'name': 'Starter',
-                'price': '$100/month',
-                'description': 'Growing companies ($1,200/year)',
-                'features': ['Advanced cap table', 'Stakeholder portal', 'Reporting']
-            })
-        
-        if "3000" in text_content or "$3,000" in text_content:
-            plans.append({
-                'name': 'Pro',
-                'price': '$250/month',
-                'description': 'Scaling companies ($3,000/year)',
-                'features': ['Everything in Starter', 'Advanced analytics', 'Priority support']
-            })
-        
-        # Fallback to looking for monthly pricing
-        if len(plans) <= 1:  # Only free plan found
-            # Look for $100 or $250 monthly
-            if "$100" in text_content:
-                plans.append({
-                    'name': 'Starter',
-                    'price': '$100/month',
-                    'description': 'Growing companies',
-                    'features': ['Advanced cap table', 'Stakeholder portal', 'Reporting']
-                })
-            if "$250" in text_content:
-                plans.append({
-                    'name': 'Pro',
-                    'price': '$250/month',
-                    'description': 'Scaling companies',
-                    'features': ['Everything in Starter', 'Advanced analytics', 'Priority support']
-                })
-        
-        if not plans:
-            return self._extract_generic_pricing(soup, text_content)
-        
-        return {
-            'plans': plans,
-            'currency': 'USD',
-            'billing_period': 'monthly',
-            'raw_text_extract': self._get_pricing_text_extract(soup)
-        }
+        remaining = list(candidate_urls)
+        pending = {}
+        handles = {}
+        last_exc = None
 
+        def start_next():
+            candidate = remaining.pop(0)
+            handle = RequestHandle()
+            future = _in_thread(self._fetch_candidate, competitor_key, competitor, candidate, previous, handle)
+            pending[future] = candidate
+            handles[future] = handle
 
+        start_next()
+        budget = min(self.hedge_delay, self.http.latency.quantile(urlparse(candidate_urls[0]).hostname) or self.hedge_delay)
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=budget if remaining else None, return_when=FIRST_COMPLETED)
+                if not done:
+                    logging.info(f"No answer from {competitor['name']} within {budget:.2f}s; trying {remaining[0]} too")
+                    start_next()
+                    continue
+                # Prefer earlier candidates when several finish together
+                for future in sorted(done, key=lambda f: candidate_urls.index(pending[f])):
+                    candidate = pending.pop(future)
+                    try:
+                        return candidate, future.result()
+                    except requests.RequestException as ex:
+                        last_exc = ex
+                        logging.warning(f"Fetch failed for {candidate}: {ex}")
+                        if remaining:
+                            start_next()
+        finally:
+            for future in pending:
+                handles[future].cancel()
+                future.add_done_callback(_close_abandoned)
+        raise last_exc if last_exc else requests.RequestException("Failed to fetch page")
 
-    def _extract_generic_pricing(self, soup, raw_html):
-        """Generic pricing extraction for sites we haven't specifically implemented"""
-        plans = []
-        
-        # Use trafilatura to get clean text content, with fallback to soup
-        text_content = None
-        if raw_html:
-            try:
-                text_content = trafilatura.extract(raw_html)
-            except:
-                pass
-        
-        if not text_content:
-            text_content = soup.get_text() if soup else ""
-        
-        if not text_content:
-            text_content = ""
-        
-        # Look for common pricing patterns
-        price_patterns = [
-            r'[\$£€]\d+(?:,\d{3})*(?:\.\d{2})?',  # $100, £1,000, €50.00
-            r'\d+(?:,\d{3})*(?:\.\d{2})?\s*(?:per|/)\s*(?:month|year|user)',  # 100 per month
-            r'(?:free|gratis|kostenlos)',  # Free plans
-            r'(?:contact|custom|enterprise)',  # Contact for pricing
-        ]
-        
-        pricing_info = []
-        for pattern in price_patterns:
-            try:
-                matches = re.findall(pattern, text_content, re.IGNORECASE)
-                pricing_info.extend(matches)
-            except:
-                continue
-        
-        # Try to find plan names and structure
-        plan_keywords = ['basic', 'starter', 'pro', 'enterprise', 'premium', 'growth', 'scale', 'free', 'standard']
-        
-        lines = text_content.split('\n') if text_content else []
-        current_plan = None
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check if line contains a plan name
-            for keyword in plan_keywords:
-                if keyword.lower() in line.lower() and len(line) < 100:  # Plan names are usually short
-                    current_plan = {
-                        'name': line,
-                        'price': 'Not specified',
-                        'features': [],
-                        'description': ''
-                    }
-                    plans.append(current_plan)
-                    break
-        
-        # If no structured plans found, create a generic entry
-        if not plans:
-            plans.append({
-                'name': 'General Pricing',
-                'price': ', '.join(pricing_info[:5]) if pricing_info else 'Contact for pricing',
-                'features': [],
-                'description': 'Pricing information extracted from page content'
-            })
-        
-        extract_text = ""
-        if text_content and len(text_content) > 0:
-            extract_text = text_content[:500] + '...' if len(text_content) > 500 else text_content
-        
-        return {
-            'plans': plans,
-            'currency': 'Unknown',
-            'billing_period': 'unknown',
-            'raw_text_extract': extract_text,
-            'pricing_mentions': pricing_info[:10]  # First 10 pricing mentions
-        }
+    def _fetch_candidate(self, competitor_key, competitor, candidate, previous, handle=None):
+        """Fetch one candidate URL; raises RequestException unless it succeeded
 
-    def _get_pricing_text_extract(self, soup):
-        """Get a clean text extract focusing on pricing information"""
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
-        
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        # Try to find pricing-related sections
-        pricing_keywords = ['pricing', 'price', 'cost', 'plan', 'subscription', 'billing', 'fee']
-        sentences = text.split('.')
-        
-        pricing_sentences = []
-        for sentence in sentences:
-            if any(keyword in sentence.lower() for keyword in pricing_keywords):
-                pricing_sentences.append(sentence.strip())
-        
-        if pricing_sentences:
-            extract = '. '.join(pricing_sentences[:5])  # First 5 relevant sentences
-        else:
-            extract = text[:500]  # First 500 characters as fallback
-        
-        return extract + '...' if len(extract) > 500 else extract
+        handle, a RequestHandle, lets a hedging caller abort the fetch.
+        """
+        headers = competitor.get('headers') or {}
+        forbidden_retry_headers = competitor.get('forbidden_retry_headers')
+        
+        logging.debug(f"Requesting {competitor['name']} at {candidate}")
+        self._wait_for_host(candidate, competitor_key)
+        version = extractor_version(competitor['extractor'])
+        conditional_headers = self._conditional_headers(candidate, previous, version)
+        response = self._fetch(competitor_key, candidate, {**headers, **conditional_headers}, handle)
+        
+        # If explicitly forbidden, try the competitor's alternate headers once
+        if response.status_code == 403 and forbidden_retry_headers:
+            logging.warning(f"403 returned; retrying {competitor['name']} with alternate headers")
+            response.close()
+            self._wait_for_host(candidate, competitor_key)
+            alt_headers = {**headers, **forbidden_retry_headers, **conditional_headers}
+            response = self._fetch(competitor_key, candidate, alt_headers, handle)
+        
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        return response
+
+    def _fetch(self, competitor_key, url, headers, handle=None):
+        """GET a page without reading its body, recording stage timings, retries and status"""
+        response = None
+        try:
+            # No timeout here: the client adapts it to the host's recent latency
+            response = self.http.get(
+                url, handle=handle, headers=headers, allow_redirects=True, verify=True, stream=True,
+            )
+            return response
+        finally:
+            timings = self.http.last_timings()
+            for stage in ('connect', 'tls', 'response', 'download'):
+                if stage in timings:
+                    SCRAPE_STAGE_SECONDS.labels(competitor_key, stage).observe(timings[stage])
+            if timings.get('retries'):
+                HTTP_RETRIES.labels(competitor_key).inc(timings['retries'])
+            if response is not None:
+                HTTP_RESPONSES.labels(competitor_key, str(response.status_code)).inc()
+
+    def _observe_extraction(self, competitor_key, info):
+        """Record parse, trafilatura and extraction time of a page
+
+        info['elapsed'] covers building the page and extracting from it; the
+        page's own timings say how much of it went to parsing and trafilatura.
+        """
+        timings = info['timings']
+        page_time = sum(timings.values())
+        trafilatura_time = timings.get('trafilatura', 0.0)
+        SCRAPE_STAGE_SECONDS.labels(competitor_key, 'parse').observe(page_time - trafilatura_time)
+        if 'trafilatura' in timings:
+            SCRAPE_STAGE_SECONDS.labels(competitor_key, 'trafilatura').observe(trafilatura_time)
+        SCRAPE_STAGE_SECONDS.labels(competitor_key, 'extract').observe(max(info['elapsed'] - page_time, 0))
+        if info['fallback']:
+            EXTRACTOR_FALLBACKS.labels(competitor_key, info['fallback']).inc()
+
+    def _observe_scrape(self, competitor_key, outcome, started):
+        """Record the outcome and total time of a scrape"""
+        SCRAPES.labels(competitor_key, outcome).inc()
+        SCRAPE_SECONDS.labels(competitor_key).observe(time.perf_counter() - started)
 
-    def scrape_all(self):
-        """Scrape all competitors"""
+    def _wait_for_host(self, url, competitor_key=None):
+        """Block until the politeness delay for the URL's host has elapsed"""
+        host = urlparse(url).hostname
+        # Reserve the next free slot for this host so concurrent callers queue up
+        with self._host_lock:
+            now = time.monotonic()
+            slot = max(now, self._host_next_slot.get(host, now))
+            self._host_next_slot[host] = slot + self.request_delay
+        wait = slot - now
+        if competitor_key:
+            SCRAPE_STAGE_SECONDS.labels(competitor_key, 'wait').observe(max(wait, 0))
+        if wait > 0:
+            logging.debug(f"Waiting {wait:.2f}s before requesting {host}")
+            time.sleep(wait)
+
+    def _store_result(self, competitor_key, run_id, snapshot):
+        """Store the Snapshot of a scrape as part of a run
+
+        Runs of scrape_all are written in one batch when they end; other
+        results are written right away.
+        """
+        with self._data_lock:
+            batch = self._run_batches.get(run_id)
+            if batch is not None:
+                batch.append((competitor_key, snapshot))
+                return
+        self.store.append_many(run_id, [(competitor_key, snapshot)])
+
+    def scrape_all(self, competitor_keys=None, progress=None):
+        """Scrape all competitors (or the given subset) concurrently
+
+        progress, if given, is called as progress(key, state, result) when a
+        competitor starts ('running') and when it finishes ('success'/'failed').
+        """
         results = {}
         logging.info("Starting scrape of all competitors")
         
-        for competitor_key in self.competitors:
-            logging.info(f"Scraping {competitor_key}")
-            results[competitor_key] = self.scrape_single(competitor_key)
-            # Rate limiting between requests
-            if competitor_key != list(self.competitors.keys())[-1]:  # Don't wait after last request
-                time.sleep(self.request_delay)
+        competitor_keys = list(competitor_keys) if competitor_keys else list(self.competitors)
+        if not competitor_keys:
+            return results
+        
+        # Results of one run share a run id and are written together
+        run_id = uuid.uuid4().hex
+        with self._data_lock:
+            self._run_batches[run_id] = []
+        
+        def scrape(competitor_key):
+            if progress:
+                progress(competitor_key, 'running', None)
+            result = self.scrape_single(competitor_key, run_id)
+            if progress:
+                progress(competitor_key, 'success' if result.get('success') else 'failed', result)
+            return result
+        
+        # Every competitor is a different host, so they can all be fetched at
+        # once; politeness is enforced per host inside scrape_single
+        workers = min(self.max_workers, len(competitor_keys))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scrape") as pool:
+                futures = {}
+                for competitor_key in competitor_keys:
+                    logging.info(f"Scraping {competitor_key}")
+                    futures[pool.submit(scrape, competitor_key)] = competitor_key
+                
+                for future in as_completed(futures):
+                    competitor_key = futures[future]
+                    try:
+                        results[competitor_key] = future.result()
+                    except Exception as e:
+                        logging.error(f"Unexpected error scraping {competitor_key}: {str(e)}")
+                        results[competitor_key] = {'success': False, 'error': str(e)}
+                        if progress:
+                            progress(competitor_key, 'failed', results[competitor_key])
+        finally:
+            with self._data_lock:
+                batch = self._run_batches.pop(run_id)
+            self.store.append_many(run_id, batch)
         
         logging.info("Completed scraping all competitors")
-        return results
+        try:
+            self.archive.prune()
+        except Exception as e:
+            logging.warning(f"Could not prune the page archive: {str(e)}")
+        stats = self.http.stats()
+        logging.info(
+            f"HTTP connections: {stats['reused_connections']} reused, "
+            f"{stats['new_connections']} new over {stats['requests']} requests"
+        )
+        # Keep results in competitor order, as before
+        return {key: results[key] for key in competitor_keys}
+
+    def connection_stats(self):
+        """Get connection reuse counters for the shared HTTP client"""
+        return self.http.stats()
+
+    @property
+    def data_version(self):
+        """Counter that changes whenever the stored data changes"""
+        # Picks up writes from other processes once the cache is stale
+        return self.store.current().version
 
     def get_all_data(self):
-        """Get all stored competitor data"""
-        return self.data.copy()
+        """Get the latest stored Snapshot of every competitor
+
+        The mapping is read-only and never changes; refreshes publish a
+        new one, so it is returned as is, without copying.
+        """
+        return self.store.latest()
 
     def get_competitor_data(self, competitor_key):
-        """Get data for a specific competitor"""
-        return self.data.get(competitor_key)
+        """Get the latest stored data for a specific competitor"""
+        return self.store.latest().get(competitor_key)
+
+    def get_plan_table(self):
+        """Get a PlanTable of the latest normalized plans of every competitor"""
+        current = self.store.current()
+        with self._data_lock:
+            if self._plan_table_source != current.version:
+                self._plan_table = PlanTable.from_data(current.snapshots)
+                self._plan_table_source = current.version
+            return self._plan_table
+
+    def get_history(self, competitor_key=None, plan=None, since=None, until=None, interval=None, after=None, limit=100):
+        """Get stored pricing over time, oldest first
+
+        Returns (items, last), where last is the (timestamp, id) to pass as
+        after for the next page, or None on the last page. With plan, only
+        that plan (matched by tier) is kept and snapshots without it are
+        skipped; more rows are read until the page is full, but at most
+        HISTORY_SCAN_PAGES * limit per call, so a rare plan gives short
+        pages with a cursor rather than one call scanning the whole
+        history. See PricingStore.history for the other arguments.
+        """
+        tier = tier_of(plan) if plan else None
+        items = []
+        for _ in range(HISTORY_SCAN_PAGES):
+            rows = self.store.history(competitor_key, since, until, interval, after, limit)
+            for row in rows:
+                after = (row['timestamp'], row['id'])
+                pricing_data = row['pricing_data'] or {}
+                plans = [
+                    {field: p.get(field) for field in HISTORY_PLAN_FIELDS}
+                    for p in pricing_data.get('plans') or []
+                    if tier is None or tier_of(p.get('name')) == tier
+                ]
+                if tier is not None and not plans:
+                    continue
+                items.append({
+                    'competitor': row['competitor'],
+                    'timestamp': row['timestamp'].isoformat(),
+                    'currency': pricing_data.get('currency'),
+                    'billing_period': pricing_data.get('billing_period'),
+                    'plans': plans,
+                })
+                if len(items) == limit:
+                    return items, after
+            if len(rows) < limit:
+                return items, None
+        return items, after
+
+    def clear_all(self):
+        """Delete all stored competitor data"""
+        self.store.clear()
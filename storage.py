@@ -0,0 +1,580 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Index, Integer, MetaData, String, Table, Text,
+    create_engine, event, exists, func, inspect, literal, select, text,
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from models import DataVersion, PricingData, Snapshot
+
+# Local state (database, archives, locks) lives here unless configured otherwise
+DATA_DIR = os.environ.get("PRICESCRAPE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+metadata = MetaData()
+
+# Append-only log of every scrape result. Only a backfill rewrites a row's
+# pricing data, and it keeps the value it replaced in replaced_extractions.
+snapshots = Table(
+    "snapshots",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("run_id", String(32), nullable=False),
+    Column("competitor", String(64), nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+    Column("name", String(255), nullable=False),
+    Column("url", Text, nullable=False),
+    Column("success", Boolean, nullable=False),
+    Column("pricing_data", JSON),
+    Column("error", Text),
+    # Archived page and extractor the pricing data came from, for backfills
+    Column("source_digest", String(64)),
+    Column("extractor_version", String(16)),
+    Index("ix_snapshots_competitor_timestamp", "competitor", "timestamp"),
+    Index("ix_snapshots_competitor_source_digest", "competitor", "source_digest"),
+    Index("ix_snapshots_timestamp", "timestamp"),
+)
+
+# Pricing data of snapshots as it was before a backfill replaced it, so a
+# bad backfill can be reverted
+replaced_extractions = Table(
+    "replaced_extractions",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("snapshot_id", Integer, nullable=False, index=True),
+    Column("pricing_data", JSON),
+    Column("extractor_version", String(16)),
+    Column("replaced_by", String(16), nullable=False),  # extractor version that replaced it
+    Column("replaced", DateTime, nullable=False),
+)
+
+# Cache validators of the last successful fetch of every URL
+validators = Table(
+    "validators",
+    metadata,
+    Column("url", String(768), primary_key=True),
+    Column("etag", Text),
+    Column("last_modified", Text),
+    Column("body_hash", String(64)),
+    Column("updated", DateTime, nullable=False),
+)
+
+# Index of the raw page archive (see archive.py): one row per distinct body
+# fetched in a row for a competitor, however often it was fetched
+archived_pages = Table(
+    "archived_pages",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("competitor", String(64), nullable=False),
+    Column("url", Text, nullable=False),
+    Column("digest", String(64), nullable=False, index=True),
+    Column("size", Integer, nullable=False),
+    Column("encoding", String(32)),
+    Column("first_seen", DateTime, nullable=False),
+    Column("last_seen", DateTime, nullable=False),
+    Index("ix_archived_pages_competitor_first_seen", "competitor", "first_seen"),
+)
+
+# Refresh jobs, so any worker can report the progress of a job
+refresh_jobs = Table(
+    "refresh_jobs",
+    metadata,
+    Column("id", String(32), primary_key=True),
+    Column("job", JSON, nullable=False),
+    Column("updated", DateTime, nullable=False, index=True),
+)
+
+
+class next_day(FunctionElement):
+    """Midnight after a timestamp, for comparing timestamps by day"""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(next_day)
+def _next_day(element, compiler, **kw):
+    # Standard SQL date arithmetic, as in PostgreSQL and MySQL
+    return f"CAST({compiler.process(element.clauses, **kw)} AS DATE) + INTERVAL '1' DAY"
+
+
+@compiles(next_day, "sqlite")
+def _next_day_sqlite(element, compiler, **kw):
+    # SQLite keeps timestamps as ISO text, which sorts like the date string
+    return f"date({compiler.process(element.clauses, **kw)}, '+1 day')"
+
+
+def default_database_url():
+    """SQLite file in the data directory, unless PRICING_DATABASE_URL is set"""
+    url = os.environ.get("PRICING_DATABASE_URL")
+    if url:
+        return url
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return f"sqlite:///{os.path.join(DATA_DIR, 'pricing_history.db')}"
+
+
+class PricingStore:
+    """Persistent, append-only store of competitor pricing snapshots.
+
+    Every scrape result is appended as a new row. The latest row per
+    competitor is what the dashboard shows, and it is served from an
+    in-process read cache that is refreshed after local writes and
+    periodically, so writes from other processes are picked up too.
+
+    The cache is an immutable DataVersion. Writers build the next version
+    and publish it by swapping one reference, so readers take the current
+    version without locking or copying and never see a half-applied write.
+
+    Cache validators and refresh jobs are kept here as well, so every
+    gunicorn worker sees the same state.
+    """
+
+    def __init__(self, database_url=None, cache_ttl=5):
+        self.database_url = database_url or default_database_url()
+        self.cache_ttl = cache_ttl  # seconds before the read cache is reloaded
+
+        if self.database_url.startswith("sqlite"):
+            self.engine = create_engine(self.database_url, connect_args={"check_same_thread": False})
+            event.listen(self.engine, "connect", _configure_sqlite)
+        else:
+            self.engine = create_engine(self.database_url, pool_pre_ping=True)
+        self._create_tables()
+
+        # Serializes writers; readers only read self._current
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._current = None
+
+        logging.info(f"PricingStore using {self.engine.url.render_as_string(hide_password=True)}")
+
+    def _create_tables(self, attempts=3):
+        """Create missing tables, tolerating workers that start at the same time"""
+        for attempt in range(attempts):
+            try:
+                metadata.create_all(self.engine)
+                self._add_missing_columns()
+                return
+            except OperationalError:
+                # Another process created a table between our check and create
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.1)
+
+    def _add_missing_columns(self):
+        """Add columns and indexes introduced after a table was first created"""
+        inspector = inspect(self.engine)
+        for table in metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            missing = [column for column in table.columns if column.name not in existing]
+            if missing:
+                with self.engine.begin() as conn:
+                    for column in missing:
+                        # New columns are nullable, so old rows need no default
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logging.info(f"Added {', '.join(column.name for column in missing)} to {table.name}")
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(self.engine, checkfirst=True)
+
+    def append_many(self, run_id, results):
+        """Append a batch of (competitor_key, Snapshot) results in one transaction"""
+        if not results:
+            return
+        rows = [
+            {
+                "run_id": run_id,
+                "competitor": competitor_key,
+                "timestamp": datetime.fromisoformat(snapshot.last_updated),
+                "name": snapshot.name,
+                "url": snapshot.url,
+                "success": bool(snapshot.success),
+                "pricing_data": snapshot.pricing_data.to_dict() if snapshot.pricing_data is not None else None,
+                "error": snapshot.error,
+                "source_digest": snapshot.source_digest,
+                "extractor_version": snapshot.extractor_version,
+            }
+            for competitor_key, snapshot in results
+        ]
+        with self.engine.begin() as conn:
+            conn.execute(snapshots.insert(), rows)
+
+        # Reflect our own writes immediately
+        with self._lock:
+            current = self._current
+            if current is not None:
+                latest = dict(current.snapshots)
+                latest.update(results)
+                self._current = DataVersion(current.version + 1, latest, current.loaded_at)
+        logging.debug(f"Stored {len(rows)} snapshots for run {run_id}")
+
+    @property
+    def version(self):
+        """Counter bumped whenever the latest data changes, so callers can cache derived views"""
+        return self.current().version
+
+    def latest(self):
+        """Get the latest Snapshot per competitor, as a read-only mapping keyed by competitor"""
+        return self.current().snapshots
+
+    def current(self):
+        """The current DataVersion, reloaded from the database once it is cache_ttl old"""
+        current = self._current
+        if current is not None and time.monotonic() - current.loaded_at < self.cache_ttl:
+            return current
+
+        # One thread reloads; the others keep serving the version they have
+        if not self._reload_lock.acquire(blocking=current is None):
+            return current
+        try:
+            current = self._current
+            if current is not None and time.monotonic() - current.loaded_at < self.cache_ttl:
+                return current
+            loaded_at = time.monotonic()
+            latest = self._load_latest()
+            with self._lock:
+                if self._current is not current:
+                    # A local write landed while we read; it is at least as new
+                    return self._current
+                if current is not None and _same_snapshots(latest, current.snapshots):
+                    self._current = DataVersion(current.version, current.snapshots, loaded_at)
+                else:
+                    # Changed elsewhere (another process) or first load
+                    self._current = DataVersion(current.version + 1 if current else 1, latest, loaded_at)
+                return self._current
+        finally:
+            self._reload_lock.release()
+
+    def latest_entry(self, competitor_key):
+        """Read the newest Snapshot of one competitor straight from the database"""
+        query = (
+            select(snapshots)
+            .where(snapshots.c.competitor == competitor_key)
+            .order_by(snapshots.c.id.desc())
+            .limit(1)
+        )
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+        return _row_to_snapshot(row) if row is not None else None
+
+    def get_validators(self, url):
+        """Cache validators stored for a URL, or None"""
+        query = select(validators).where(validators.c.url == url)
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+        if row is None:
+            return None
+        return {"etag": row.etag, "last_modified": row.last_modified, "body_hash": row.body_hash}
+
+    def set_validators(self, url, etag, last_modified, body_hash):
+        """Store the cache validators of a successful fetch of a URL"""
+        with self.engine.begin() as conn:
+            conn.execute(validators.delete().where(validators.c.url == url))
+            conn.execute(validators.insert().values(
+                url=url, etag=etag, last_modified=last_modified, body_hash=body_hash,
+                updated=datetime.now(),
+            ))
+
+    def save_job(self, job):
+        """Store the current state of a refresh job"""
+        with self.engine.begin() as conn:
+            conn.execute(refresh_jobs.delete().where(refresh_jobs.c.id == job["id"]))
+            conn.execute(refresh_jobs.insert().values(id=job["id"], job=job, updated=datetime.now()))
+
+    def load_job(self, job_id):
+        """Read a refresh job stored by any process, or None"""
+        query = select(refresh_jobs.c.job).where(refresh_jobs.c.id == job_id)
+        with self.engine.connect() as conn:
+            return conn.execute(query).scalar()
+
+    def prune_jobs(self, max_age):
+        """Delete refresh jobs not updated for max_age seconds"""
+        cutoff = datetime.now() - timedelta(seconds=max_age)
+        with self.engine.begin() as conn:
+            conn.execute(refresh_jobs.delete().where(refresh_jobs.c.updated < cutoff))
+
+    def history(self, competitor_key=None, since=None, until=None, interval=None, after=None, limit=100):
+        """Successful snapshots in time order, as dicts with id, competitor, timestamp and pricing_data
+
+        since and until bound the timestamp (until is exclusive). With
+        interval 'day' only each competitor's last snapshot of every day
+        is returned. after is the (timestamp, id) of the last row of the
+        previous page. Rows are read in timestamp order from the page
+        boundary on, so a page costs about the rows it spans, not the
+        whole range.
+        """
+        filters = [snapshots.c.success]
+        if competitor_key is not None:
+            filters.append(snapshots.c.competitor == competitor_key)
+        if since is not None:
+            filters.append(snapshots.c.timestamp >= since)
+        if until is not None:
+            filters.append(snapshots.c.timestamp < until)
+
+        query = select(
+            snapshots.c.id, snapshots.c.competitor, snapshots.c.timestamp, snapshots.c.pricing_data,
+        ).where(*filters)
+        if interval == "day":
+            # Keep a row only if no later successful row of the competitor falls
+            # on the same day; each check is a short (competitor, timestamp) range
+            later = snapshots.alias("later")
+            same_day_later = [
+                later.c.competitor == snapshots.c.competitor,
+                later.c.success,
+                later.c.timestamp >= snapshots.c.timestamp,
+                later.c.timestamp < next_day(snapshots.c.timestamp),
+                (later.c.timestamp > snapshots.c.timestamp) | (later.c.id > snapshots.c.id),
+            ]
+            if until is not None:
+                same_day_later.append(later.c.timestamp < until)
+            query = query.where(~exists().where(*same_day_later))
+        elif interval is not None:
+            raise ValueError(f"Unsupported interval: {interval}")
+
+        if after is not None:
+            timestamp, row_id = after
+            query = query.where(
+                (snapshots.c.timestamp > timestamp)
+                | ((snapshots.c.timestamp == timestamp) & (snapshots.c.id > row_id))
+            )
+        query = query.order_by(snapshots.c.timestamp, snapshots.c.id).limit(limit)
+        with self.engine.connect() as conn:
+            return [row._asdict() for row in conn.execute(query)]
+
+    def iter_snapshots(self, competitor_key=None, since=None, until=None, batch_size=500):
+        """Yield every stored snapshot in time order as an entry dict with its competitor
+
+        Rows are read in batches over the timestamp indexes, each with a
+        short-lived connection, so a slow consumer neither holds the
+        database nor makes the whole history sit in memory.
+        """
+        filters = []
+        if competitor_key is not None:
+            filters.append(snapshots.c.competitor == competitor_key)
+        if since is not None:
+            filters.append(snapshots.c.timestamp >= since)
+        if until is not None:
+            filters.append(snapshots.c.timestamp < until)
+        after = None
+        while True:
+            query = select(snapshots).where(*filters)
+            if after is not None:
+                query = query.where(
+                    (snapshots.c.timestamp > after[0])
+                    | ((snapshots.c.timestamp == after[0]) & (snapshots.c.id > after[1]))
+                )
+            query = query.order_by(snapshots.c.timestamp, snapshots.c.id).limit(batch_size)
+            with self.engine.connect() as conn:
+                rows = conn.execute(query).all()
+            for row in rows:
+                yield {
+                    "competitor": row.competitor,
+                    "name": row.name,
+                    "url": row.url,
+                    "last_updated": row.timestamp.isoformat(),
+                    "success": row.success,
+                    "pricing_data": row.pricing_data,
+                    "error": row.error,
+                }
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1].timestamp, rows[-1].id)
+
+    def stale_sources(self, competitor_key, extractor_version):
+        """Digests of archived pages behind the competitor's snapshots that another extractor version produced"""
+        query = (
+            select(snapshots.c.source_digest)
+            .where(
+                snapshots.c.competitor == competitor_key,
+                snapshots.c.source_digest.is_not(None),
+                snapshots.c.success,
+                (snapshots.c.extractor_version != extractor_version) | snapshots.c.extractor_version.is_(None),
+            )
+            .distinct()
+        )
+        with self.engine.connect() as conn:
+            return list(conn.execute(query).scalars())
+
+    def sources(self, competitor_key):
+        """Digests of every archived page behind the competitor's snapshots"""
+        query = (
+            select(snapshots.c.source_digest)
+            .where(snapshots.c.competitor == competitor_key, snapshots.c.source_digest.is_not(None), snapshots.c.success)
+            .distinct()
+        )
+        with self.engine.connect() as conn:
+            return list(conn.execute(query).scalars())
+
+    def update_extraction(self, competitor_key, digest, pricing_data, extractor_version):
+        """Replace the pricing data of every snapshot extracted from an archived page
+
+        The replaced data is kept in replaced_extractions for
+        revert_extraction. Returns the number of snapshots updated.
+        """
+        extracted_from_page = [
+            snapshots.c.competitor == competitor_key,
+            snapshots.c.source_digest == digest,
+            snapshots.c.success,
+        ]
+        keep = replaced_extractions.insert().from_select(
+            ["snapshot_id", "pricing_data", "extractor_version", "replaced_by", "replaced"],
+            select(
+                snapshots.c.id, snapshots.c.pricing_data, snapshots.c.extractor_version,
+                literal(extractor_version, String), literal(datetime.now(), DateTime),
+            ).where(*extracted_from_page),
+        )
+        query = (
+            snapshots.update()
+            .where(*extracted_from_page)
+            .values(pricing_data=pricing_data, extractor_version=extractor_version)
+        )
+        with self.engine.begin() as conn:
+            conn.execute(keep)
+            return conn.execute(query).rowcount
+
+    def revert_extraction(self, competitor_key, extractor_version):
+        """Undo backfills that wrote extractor_version into the competitor's snapshots
+
+        Every such snapshot gets back the pricing data it had before the
+        last backfill replaced it; snapshots the scraper wrote itself are
+        left alone. Returns the number of snapshots restored.
+        """
+        last_replaced = (
+            select(func.max(replaced_extractions.c.id))
+            .where(replaced_extractions.c.replaced_by == extractor_version)
+            .group_by(replaced_extractions.c.snapshot_id)
+        )
+        query = (
+            select(replaced_extractions)
+            .join(snapshots, snapshots.c.id == replaced_extractions.c.snapshot_id)
+            .where(
+                replaced_extractions.c.id.in_(last_replaced),
+                snapshots.c.competitor == competitor_key,
+                snapshots.c.extractor_version == extractor_version,
+            )
+        )
+        with self.engine.begin() as conn:
+            rows = conn.execute(query).all()
+            for row in rows:
+                conn.execute(
+                    snapshots.update()
+                    .where(snapshots.c.id == row.snapshot_id)
+                    .values(pricing_data=row.pricing_data, extractor_version=row.extractor_version)
+                )
+                conn.execute(replaced_extractions.delete().where(replaced_extractions.c.id == row.id))
+        return len(rows)
+
+    def record_page(self, competitor_key, url, digest, size, encoding, seen):
+        """Index a fetched body, extending the competitor's last version if it is the same page"""
+        last = (
+            select(archived_pages.c.id, archived_pages.c.url, archived_pages.c.digest)
+            .where(archived_pages.c.competitor == competitor_key)
+            .order_by(archived_pages.c.id.desc())
+            .limit(1)
+        )
+        with self.engine.begin() as conn:
+            row = conn.execute(last).first()
+            if row is not None and row.digest == digest and row.url == url:
+                conn.execute(archived_pages.update().where(archived_pages.c.id == row.id).values(last_seen=seen))
+            else:
+                conn.execute(archived_pages.insert().values(
+                    competitor=competitor_key, url=url, digest=digest, size=size, encoding=encoding,
+                    first_seen=seen, last_seen=seen,
+                ))
+
+    def archived_pages(self, competitor_key=None, since=None, until=None):
+        """Archived page versions as dicts, by competitor and then oldest first
+
+        since and until bound the time a version was first seen.
+        """
+        query = select(archived_pages).order_by(archived_pages.c.competitor, archived_pages.c.first_seen)
+        if competitor_key is not None:
+            query = query.where(archived_pages.c.competitor == competitor_key)
+        if since is not None:
+            query = query.where(archived_pages.c.first_seen >= since)
+        if until is not None:
+            query = query.where(archived_pages.c.first_seen < until)
+        with self.engine.connect() as conn:
+            return [row._asdict() for row in conn.execute(query)]
+
+    def prune_archived_pages(self, max_age, keep_versions):
+        """Forget page versions not seen for max_age seconds, beyond each competitor's newest keep_versions
+
+        Returns the digests no longer referenced by any version.
+        """
+        cutoff = datetime.now() - timedelta(seconds=max_age)
+        rank = func.row_number().over(
+            partition_by=archived_pages.c.competitor, order_by=archived_pages.c.id.desc(),
+        ).label("rank")
+        ranked = select(archived_pages.c.id, archived_pages.c.digest, archived_pages.c.last_seen, rank).subquery()
+        expired = select(ranked.c.id, ranked.c.digest).where(ranked.c.rank > keep_versions, ranked.c.last_seen < cutoff)
+        with self.engine.begin() as conn:
+            rows = conn.execute(expired).all()
+            if not rows:
+                return set()
+            conn.execute(archived_pages.delete().where(archived_pages.c.id.in_([row.id for row in rows])))
+            digests = {row.digest for row in rows}
+            still_used = conn.execute(
+                select(archived_pages.c.digest).where(archived_pages.c.digest.in_(digests)).distinct()
+            ).scalars()
+            return digests - set(still_used)
+
+    def clear(self):
+        """Delete every stored snapshot and cache validator"""
+        with self.engine.begin() as conn:
+            conn.execute(snapshots.delete())
+            conn.execute(validators.delete())
+        with self._lock:
+            current = self._current
+            self._current = DataVersion(current.version + 1 if current else 1, {}, time.monotonic())
+
+    def _load_latest(self):
+        """Read the newest snapshot of every competitor from the database"""
+        newest = select(func.max(snapshots.c.id)).group_by(snapshots.c.competitor)
+        query = select(snapshots).where(snapshots.c.id.in_(newest)).order_by(snapshots.c.id)
+        with self.engine.connect() as conn:
+            return {row.competitor: _row_to_snapshot(row) for row in conn.execute(query)}
+
+
+def _row_to_snapshot(row):
+    """Convert a snapshot row into the Snapshot the scraper exposes"""
+    return Snapshot(
+        row.name,
+        row.url,
+        row.timestamp.isoformat(),
+        row.success,
+        PricingData.from_dict(row.pricing_data),
+        row.error,
+        row.source_digest,
+        row.extractor_version,
+    )
+
+
+def _same_snapshots(a, b):
+    """Whether two latest-snapshot mappings hold the same results"""
+    if a.keys() != b.keys():
+        return False
+    # A competitor's newest row only changes along with its timestamp, or
+    # its extractor version when a backfill re-extracts it
+    return all(
+        a[key].last_updated == b[key].last_updated
+        and a[key].success == b[key].success
+        and a[key].extractor_version == b[key].extractor_version
+        for key in a
+    )
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Let readers and a writer use the SQLite file at the same time"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
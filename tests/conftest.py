@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Modules that create databases, archives or locks on import keep them out of data/
+os.environ.setdefault("PRICESCRAPE_DATA_DIR", tempfile.mkdtemp(prefix="pricescrape-tests-"))
+os.environ.pop("PRICING_DATABASE_URL", None)
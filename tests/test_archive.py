@@ -0,0 +1,75 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import PageArchive
+from storage import PricingStore
+
+
+@pytest.fixture
+def archive(tmp_path):
+    store = PricingStore(database_url=f"sqlite:///{tmp_path}/archive.db")
+    return PageArchive(store, str(tmp_path / "archive"), max_age=86400, keep_versions=2)
+
+
+def add(archive, body, competitor="bolago", url="https://bolago.com/se/priser/", seen=None):
+    writer = archive.writer()
+    for i in range(0, len(body), 7):
+        writer.write(body[i:i + 7])
+    digest = hashlib.sha256(body).hexdigest()
+    assert archive.add(competitor, url, writer, digest, len(body), "utf-8", seen)
+    return digest
+
+
+def objects(archive):
+    return sorted(name for _, _, names in os.walk(os.path.join(archive.directory, "objects")) for name in names)
+
+
+def test_body_is_stored_compressed_and_read_back(archive):
+    body = b"<html>Starter 395 kr</html>" * 100
+    digest = add(archive, body)
+    assert archive.read(digest) == body
+    assert os.path.getsize(archive.path_for(digest)) < len(body)
+    copy = io.BytesIO()
+    archive.copy_to(digest, copy)
+    assert copy.getvalue() == body
+    assert os.listdir(os.path.join(archive.directory, "tmp")) == []
+
+
+def test_identical_fetches_share_one_object_and_version(archive):
+    first = datetime(2025, 1, 1)
+    digest = add(archive, b"page one", seen=first)
+    add(archive, b"page one", seen=first + timedelta(hours=1))
+    [version] = archive.versions("bolago")
+    assert (version["digest"], version["first_seen"], version["last_seen"]) == (digest, first, first + timedelta(hours=1))
+
+    # The same body again after another one is a new version of the same object
+    add(archive, b"page two", seen=first + timedelta(hours=2))
+    add(archive, b"page one", seen=first + timedelta(hours=3))
+    assert [v["digest"] for v in archive.versions("bolago")] == [digest, hashlib.sha256(b"page two").hexdigest(), digest]
+    assert len(objects(archive)) == 2
+
+
+def test_failed_writer_is_not_archived(archive):
+    writer = archive.writer()
+    writer.write(b"partial")
+    writer._fail(OSError("disk full"))
+    assert not archive.add("bolago", "https://bolago.com", writer, "0" * 64, 7)
+    assert archive.versions() == []
+    assert objects(archive) == []
+
+
+def test_prune_keeps_recent_and_newest_versions(archive):
+    old = datetime.now() - timedelta(days=30)
+    digests = [add(archive, f"version {i}".encode(), seen=old + timedelta(minutes=i)) for i in range(4)]
+    # Another competitor still uses the first body
+    add(archive, b"version 0", competitor="ledgy", url="https://ledgy.com", seen=datetime.now())
+
+    assert archive.prune() == 1
+    assert [v["digest"] for v in archive.versions("bolago")] == digests[2:]
+    assert archive.read(digests[0]) == b"version 0"
+    with pytest.raises(FileNotFoundError):
+        archive.read(digests[1])
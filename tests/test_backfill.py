@@ -0,0 +1,74 @@
+import hashlib
+import os
+
+import pytest
+from sqlalchemy import select
+
+import backfill
+from archive import PageArchive
+from extractors import extractor_version
+from models import PricingData, Snapshot
+from storage import PricingStore, snapshots
+
+REGISTRY = {"bolago": {"name": "Bolago", "extractor": "spec:bolago"}}
+PAGE = "<html><body><h2>Starter</h2><p>3 950 kr/år</p><h2>Grow</h2><p>16 950 kr/år</p></body></html>".encode()
+OLD_PRICING = {"plans": [{"name": "Gratis", "price": "0 kr"}], "currency": "SEK", "billing_period": "yearly"}
+
+
+@pytest.fixture
+def setup(tmp_path):
+    store = PricingStore(database_url=f"sqlite:///{tmp_path}/backfill.db")
+    archive = PageArchive(store, str(tmp_path / "archive"))
+    writer = archive.writer()
+    writer.write(PAGE)
+    digest = hashlib.sha256(PAGE).hexdigest()
+    archive.add("bolago", "https://bolago.com/se/priser/", writer, digest, len(PAGE), "utf-8")
+    store.append_many("run", [
+        ("bolago", Snapshot(
+            "Bolago", "https://bolago.com/se/priser/", f"2025-01-0{day}T12:00:00", True,
+            PricingData.from_dict(OLD_PRICING), source_digest=digest, extractor_version="old",
+        ))
+        for day in (1, 2)
+    ])
+    return store, archive
+
+
+def stored(store):
+    with store.engine.connect() as conn:
+        rows = conn.execute(select(snapshots.c.pricing_data, snapshots.c.extractor_version).order_by(snapshots.c.id))
+        return [([plan["name"] for plan in row.pricing_data["plans"]], row.extractor_version) for row in rows]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_outdated_snapshots_are_reextracted_once(setup, workers):
+    store, archive = setup
+    version = extractor_version("spec:bolago")
+    assert backfill.run(store, archive, REGISTRY, ["bolago"], workers=1, dry_run=True)["pages"] == 1
+    assert stored(store) == [(["Gratis"], "old")] * 2
+
+    counts = backfill.run(store, archive, REGISTRY, ["bolago"], workers=workers)
+    assert (counts["reextracted"], counts["snapshots"], counts["failed"]) == (1, 2, 0)
+    assert stored(store) == [(["Starter", "Grow"], version)] * 2
+    # Up to date now
+    assert backfill.run(store, archive, REGISTRY, ["bolago"], workers=1)["pages"] == 0
+
+
+def test_revert_restores_replaced_pricing(setup):
+    store, archive = setup
+    backfill.run(store, archive, REGISTRY, ["bolago"], workers=1)
+    backfill.run(store, archive, REGISTRY, ["bolago"], workers=1, everything=True)
+    # Each revert undoes one backfill, newest first
+    assert backfill.revert(store, REGISTRY, ["bolago"]) == 2
+    assert stored(store) == [(["Starter", "Grow"], extractor_version("spec:bolago"))] * 2
+    assert backfill.revert(store, REGISTRY, ["bolago"]) == 2
+    assert stored(store) == [(["Gratis"], "old")] * 2
+    assert backfill.revert(store, REGISTRY, ["bolago"]) == 0
+
+
+def test_pruned_pages_are_counted_missing(setup):
+    store, archive = setup
+    for version in archive.versions("bolago"):
+        os.remove(archive.path_for(version["digest"]))
+    counts = backfill.run(store, archive, REGISTRY, ["bolago"], workers=1)
+    assert (counts["missing"], counts["snapshots"]) == (1, 0)
+    assert stored(store) == [(["Gratis"], "old")] * 2
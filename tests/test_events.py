@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from events import ChangeFeed, FeedFull, fingerprint
+from models import DataVersion, Snapshot
+
+
+class FakeStore:
+    def __init__(self, snapshots):
+        self.data = DataVersion(1, snapshots, 0)
+
+    def current(self):
+        return self.data
+
+    def publish(self, snapshots):
+        self.data = DataVersion(self.data.version + 1, snapshots, 0)
+
+
+def render(snapshots, keys):
+    return {
+        "cards": {key: f"<div>{snapshots[key].last_updated}</div>" for key in keys},
+        "stats": {"total": len(snapshots)},
+    }
+
+
+def snapshot(name, last_updated):
+    return Snapshot(name, "https://example.com", last_updated, True)
+
+
+def parse(event):
+    fields = dict(line.split(": ", 1) for line in event.strip().splitlines())
+    return fields.get("id"), json.loads(fields["data"])
+
+
+@pytest.fixture
+def store():
+    return FakeStore({"a": snapshot("A", "2025-01-01T00:00:00"), "b": snapshot("B", "2025-01-01T00:00:00")})
+
+
+@pytest.fixture
+def feed(store):
+    return ChangeFeed(store, render, poll_interval=3600, heartbeat=0.01, max_subscribers=2)
+
+
+def test_new_subscriber_gets_every_card(store, feed):
+    events = feed.stream(feed.subscribe())
+    assert next(events).startswith("retry:")
+    event_id, data = parse(next(events))
+    assert event_id == fingerprint(store.current().snapshots)
+    assert data["full"] and set(data["cards"]) == {"a", "b"}
+    events.close()
+
+
+def test_subscriber_with_current_data_gets_no_full_event(store, feed):
+    events = feed.stream(feed.subscribe(), fingerprint(store.current().snapshots))
+    next(events)
+    assert next(events) == ": keep-alive\n\n"
+    events.close()
+
+
+def test_changes_are_pushed_as_incremental_events(store, feed):
+    events = feed.stream(feed.subscribe(), fingerprint(store.current().snapshots))
+    next(events)
+    assert next(events) == ": keep-alive\n\n"
+    store.publish({"a": store.current().snapshots["a"], "c": snapshot("C", "2025-01-02T00:00:00")})
+    feed._publish()
+    event_id, data = parse(next(events))
+    assert event_id == fingerprint(store.current().snapshots)
+    assert set(data["cards"]) == {"c"}
+    assert data["removed"] == ["b"]
+    events.close()
+
+
+def test_subscribers_are_capped(feed):
+    first = feed.subscribe()
+    feed.subscribe()
+    with pytest.raises(FeedFull):
+        feed.subscribe()
+    # A stream closed before its first event still frees its place
+    feed.unsubscribe(first)
+    feed.subscribe()
+
+
+def test_finished_stream_unsubscribes(feed):
+    for _ in range(3):
+        events = feed.stream(feed.subscribe())
+        next(events)
+        events.close()
+
+
+@pytest.fixture
+def client():
+    import app
+
+    app.app.config["TESTING"] = True
+    return app.app.test_client()
+
+
+def test_stream_turns_dashboards_away_beyond_the_cap(client, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app.change_feed, "max_subscribers", 0)
+    response = client.get("/api/stream")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(app.STREAM_RETRY_AFTER)
+    assert response.get_data(as_text=True).startswith("retry: ")
+
+
+def test_dashboard_carries_the_fingerprint_of_its_cards(client):
+    import app
+
+    app.scraper.store.append_many("run", [("example", snapshot("Example", "2025-01-01T00:00:00"))])
+    expected = fingerprint(app.scraper.store.current().snapshots)
+    page = client.get("/").get_data(as_text=True)
+    assert f'id="competitor-cards" data-fingerprint="{expected}"' in page
@@ -0,0 +1,50 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from models import Snapshot
+
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+
+    app.app.config["TESTING"] = True
+    app.scraper.store.append_many("export", [
+        (key, Snapshot(key.title(), "https://example.com", f"2025-01-0{day}T12:00:00", True))
+        for day in (1, 2, 3) for key in ("bolago", "ledgy")
+    ])
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("query", ["scope=history", "competitor=ledgy", "since=2025-01-02", "until=2025-01-02", "gzip=1"])
+def test_json_export_refuses_streaming_options(client, query):
+    response = client.get(f"/export?{query}")
+    assert response.status_code == 400
+    assert "format=ndjson" in response.get_json()["error"]
+
+
+def test_json_export_of_latest_data(client):
+    for query in ("", "?scope=latest", "?format=json"):
+        response = client.get(f"/export{query}")
+        assert response.status_code == 200
+        assert set(json.loads(response.data)) >= {"bolago", "ledgy"}
+
+
+def test_ndjson_history_export_is_filtered(client):
+    response = client.get("/export?format=ndjson&scope=history&competitor=ledgy&since=2025-01-02")
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(row["competitor"], row["last_updated"]) for row in rows] == [
+        ("ledgy", "2025-01-02T12:00:00"),
+        ("ledgy", "2025-01-03T12:00:00"),
+    ]
+
+
+def test_gzipped_csv_export(client):
+    response = client.get("/export?format=csv&scope=history&gzip=1")
+    assert response.mimetype == "application/gzip"
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode("utf-8"))))
+    assert {row["competitor"] for row in rows} >= {"bolago", "ledgy"}
@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from extractors import EXTRACTOR_SPECS, GenericExtractor, KeywordMatcher, SpecExtractor
+
+
+class TextPage:
+    """Stand-in for ParsedPage with a fixed text"""
+
+    def __init__(self, text):
+        self.text = text
+        self.clean_text = None
+        self.pricing_extract = text[:100]
+
+
+def naive_find(tokens, text):
+    return {
+        (token, ignore_case) for token, ignore_case in tokens
+        if (token.lower() in text.lower() if ignore_case else token in text)
+    }
+
+
+def test_keyword_matcher_agrees_with_substring_search():
+    rng = random.Random(8)
+    alphabet = "abAB $1"
+    for _ in range(300):
+        tokens = {
+            ("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))), rng.random() < 0.5)
+            for _ in range(rng.randint(1, 12))
+        }
+        matcher = KeywordMatcher(tokens)
+        for _ in range(5):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            assert matcher.find(text) == naive_find(tokens, text), (tokens, text)
+
+
+def test_keyword_matcher_overlapping_and_nested_tokens():
+    tokens = {("pro", True), ("Pro", False), ("product", False), ("3 950", False), ("950", False)}
+    found = KeywordMatcher(tokens).find("PRODUCT: 3 950 kr")
+    assert found == {("pro", True), ("3 950", False), ("950", False)}
+
+
+# The per-competitor extractors as they were hand-written before the specs,
+# reduced to the plan names they returned ('generic' for Mantle's fallback)
+def legacy_bolago(text):
+    lower = text.lower()
+    names = []
+    if "gratis" in lower or "free" in lower:
+        names.append("Gratis")
+    if "starter" in lower and ("395" in text or "3950" in text or "3 950" in text):
+        names.append("Starter")
+    if "grow" in lower and ("1695" in text or "16950" in text or "16 950" in text):
+        names.append("Grow")
+    if "pro" in lower or "enterprise" in lower:
+        names.append("Pro")
+    return names or ["Gratis", "Starter", "Grow", "Pro"]
+
+
+def legacy_nvr(text):
+    names = []
+    if "Basic" in text and "0 kr/månad" in text:
+        names.append("Basic")
+    if "Starter" in text and "49 kr/månad" in text:
+        names.append("Starter")
+    if "Pro" in text and "750 kr/månad" in text:
+        names.append("Pro")
+    return names
+
+
+def legacy_ledgy(text):
+    names = []
+    if "Growth" in text and "€900/year" in text:
+        names.append("Growth")
+    if "Scale" in text and "€3k/year" in text:
+        names.append("Scale")
+    if "Enterprise" in text:
+        names.append("Enterprise")
+    return names
+
+
+def legacy_carta(text):
+    return [name for name in ("Raise", "Build", "Grow", "Scale") if name in text]
+
+
+def legacy_cakeequity(text):
+    return ["Free", "Starter", "Growth", "Pro"]
+
+
+def legacy_mantle(text):
+    names = []
+    if "free" in text.lower():
+        names.append("Free")
+    if "1200" in text or "$1,200" in text:
+        names.append("Starter")
+    if "3000" in text or "$3,000" in text:
+        names.append("Pro")
+    if len(names) <= 1:
+        if "$100" in text:
+            names.append("Starter")
+        if "$250" in text:
+            names.append("Pro")
+    return names or "generic"
+
+
+LEGACY = {
+    "bolago": legacy_bolago,
+    "nvr": legacy_nvr,
+    "ledgy": legacy_ledgy,
+    "carta": legacy_carta,
+    "cakeequity": legacy_cakeequity,
+    "mantle": legacy_mantle,
+}
+
+# Trigger tokens of all the specs in varying case, plus near misses
+VOCABULARY = [
+    "Raise", "Build", "Grow", "grow", "GROW", "Scale", "Basic", "Starter", "starter", "STARTER", "Pro", "pro",
+    "PRO", "product", "Growth", "Enterprise", "enterprise", "Gratis", "free", "Free", "FREE", "freedom",
+    "395", "3950", "3 950", "1695", "16950", "16 950", "0 kr/månad", "49 kr/månad", "750 kr/månad",
+    "€900/year", "€3k/year", "1200", "$1,200", "3000", "$3,000", "$100", "$250", "kr", "per", "month", "\n",
+]
+
+
+@pytest.mark.parametrize("key", sorted(LEGACY))
+def test_spec_matches_legacy_extractor(key):
+    extractor = SpecExtractor(EXTRACTOR_SPECS[key])
+    rng = random.Random(key)
+    for _ in range(400):
+        text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(0, 12)))
+        result = extractor.extract(TextPage(text))
+        names = "generic" if result is None else [plan["name"] for plan in result["plans"]]
+        assert names == LEGACY[key](text), text
+
+
+def test_mantle_monthly_fallback_plans():
+    result = SpecExtractor(EXTRACTOR_SPECS["mantle"]).extract(TextPage("Free plan, then $100 or $250"))
+    assert [(plan["name"], plan["description"]) for plan in result["plans"]] == [
+        ("Free", "Basic equity management"),
+        ("Starter", "Growing companies"),
+        ("Pro", "Scaling companies"),
+    ]
+    assert result["currency"] == "USD"
+
+
+def test_generic_extractor_finds_plans_and_mentions():
+    text = "Pricing\nStarter\n$40 per month\nPro plan\nContact sales for enterprise\nour product is free"
+    result = GenericExtractor().extract(TextPage(text))
+    names = [plan["name"] for plan in result["plans"]]
+    assert names[:3] == ["Starter", "Pro plan", "Contact sales for enterprise"]
+    assert "$40" in result["pricing_mentions"]
@@ -0,0 +1,107 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import HttpClient, RequestHandle
+from resilience import CircuitBreaker, HALF_OPEN, OPEN
+from scraper import CompetitorScraper
+
+PAGE = b"<html><body><h2>Pro</h2><p>$40/month</p></body></html>"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def page_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/pricing"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def black_hole_url():
+    """URL of a host that accepts connections and never answers"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}/pricing"
+    sock.close()
+
+
+def get_in_thread(client, url, handle):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["response"] = client.get(url, handle=handle, timeout=30)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def test_cancel_aborts_a_blocked_request(black_hole_url):
+    client = HttpClient()
+    handle = RequestHandle()
+    thread, outcome = get_in_thread(client, black_hole_url, handle)
+    time.sleep(0.2)
+    started = time.monotonic()
+    handle.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert time.monotonic() - started < 2
+    assert isinstance(outcome["error"], requests.RequestException)
+    # An abandoned request says nothing about the host
+    assert client.breaker.states() == {}
+
+
+def test_cancelled_probe_does_not_leave_circuit_half_open(black_hole_url):
+    client = HttpClient(breaker=CircuitBreaker(failure_threshold=1, cooldown=0))
+    client.breaker.record_failure("127.0.0.1")
+    handle = RequestHandle()
+    thread, outcome = get_in_thread(client, black_hole_url, handle)
+    time.sleep(0.2)
+    assert client.breaker.state("127.0.0.1") == HALF_OPEN
+    handle.cancel()
+    thread.join(5)
+    assert "error" in outcome
+    assert client.breaker.state("127.0.0.1") == OPEN
+    assert client.breaker.allow("127.0.0.1")
+
+
+def test_hedge_wins_over_unresponsive_primary(black_hole_url, page_url):
+    scraper = CompetitorScraper(registry={})
+    scraper.request_delay = 0
+    scraper.hedge_delay = 0.1
+    competitor = {"name": "Example", "extractor": "generic"}
+    started = time.monotonic()
+    url, response = scraper._fetch_first("example", competitor, [black_hole_url, page_url], None)
+    assert url == page_url
+    assert response.content == PAGE
+    assert time.monotonic() - started < 2
+
+    # The abandoned primary is aborted rather than left to time out
+    deadline = time.monotonic() + 2
+    while any(thread.name == "hedge" for thread in threading.enumerate()) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not any(thread.name == "hedge" for thread in threading.enumerate())
+    assert scraper.http.breaker.states() == {}
@@ -0,0 +1,119 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import decode_cursor, encode_cursor
+from models import Snapshot
+from storage import PricingStore
+
+
+def test_cursor_round_trip():
+    last = (datetime(2025, 3, 1, 12, 30, 5, 123456), 4711)
+    assert decode_cursor(encode_cursor(last)) == last
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "MjAyNS0wMy0wMQ=="])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    store = PricingStore(database_url=f"sqlite:///{tmp_path_factory.mktemp('history')}/history.db")
+    rng = random.Random(23)
+    start = datetime(2025, 1, 1)
+    results = []
+    for i in range(300):
+        timestamp = start + timedelta(hours=rng.randint(0, 24 * 20))
+        key = rng.choice(["bolago", "ledgy", "nvr"])
+        results.append((key, Snapshot(key, "https://example.com", timestamp.isoformat(), rng.random() < 0.9)))
+    # Several snapshots at one timestamp tie on it and page by id
+    results += [("bolago", Snapshot("bolago", "https://example.com", start.isoformat(), True))] * 5
+    store.append_many("run", results)
+    return store
+
+
+def all_pages(store, limit, **filters):
+    rows, after = [], None
+    while True:
+        page = store.history(after=after, limit=limit, **filters)
+        rows += page
+        if len(page) < limit:
+            return rows
+        after = (page[-1]["timestamp"], page[-1]["id"])
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50])
+@pytest.mark.parametrize("filters", [{}, {"competitor_key": "ledgy"}, {"until": datetime(2025, 1, 10)}])
+@pytest.mark.parametrize("interval", [None, "day"])
+def test_pages_cover_every_row_once(store, limit, filters, interval):
+    expected = store.history(interval=interval, limit=10_000, **filters)
+    rows = all_pages(store, limit, interval=interval, **filters)
+    assert rows == expected
+    assert [(row["timestamp"], row["id"]) for row in rows] == sorted((row["timestamp"], row["id"]) for row in rows)
+
+
+def test_day_interval_keeps_last_snapshot_per_day(store):
+    raw = store.history(limit=10_000)
+    last = {}
+    for row in raw:
+        last[row["competitor"], row["timestamp"].date()] = row["id"]
+    assert sorted(row["id"] for row in store.history(interval="day", limit=10_000)) == sorted(last.values())
+
+
+def test_next_day_compiles_for_sqlite_and_postgres():
+    from sqlalchemy.dialects import postgresql, sqlite
+
+    from storage import next_day, snapshots
+
+    expression = next_day(snapshots.c.timestamp)
+    assert str(expression.compile(dialect=sqlite.dialect())) == "date(snapshots.timestamp, '+1 day')"
+    assert str(expression.compile(dialect=postgresql.dialect())) == (
+        "CAST(snapshots.timestamp AS DATE) + INTERVAL '1' DAY"
+    )
+
+
+@pytest.fixture(scope="module")
+def plan_scraper(tmp_path_factory):
+    from models import PricingData
+    from scraper import CompetitorScraper
+
+    scraper = CompetitorScraper(registry={})
+    scraper.store = PricingStore(database_url=f"sqlite:///{tmp_path_factory.mktemp('plans')}/plans.db")
+    start = datetime(2025, 1, 1)
+    results = []
+    for i in range(200):
+        # Only every 50th snapshot has an Enterprise plan
+        names = ["Free", "Pro"] + (["Enterprise"] if i % 50 == 0 else [])
+        pricing = PricingData.from_dict({"plans": [{"name": name, "price": "Custom"} for name in names], "currency": "EUR"})
+        snapshot = Snapshot("Ledgy", "https://example.com", (start + timedelta(minutes=i)).isoformat(), True, pricing)
+        results.append(("ledgy", snapshot))
+    scraper.store.append_many("run", results)
+    return scraper
+
+
+def test_plan_filter_scans_a_bounded_number_of_rows(plan_scraper, monkeypatch):
+    import scraper as scraper_module
+
+    monkeypatch.setattr(scraper_module, "HISTORY_SCAN_PAGES", 3)
+    calls = []
+    history = plan_scraper.store.history
+    monkeypatch.setattr(plan_scraper.store, "history", lambda *args: calls.append(args) or history(*args))
+
+    items, after = plan_scraper.get_history(plan="nonexistent", interval=None, limit=10)
+    assert items == []
+    assert len(calls) == 3
+    assert after is not None
+
+    items, after = [], None
+    while True:
+        page, after = plan_scraper.get_history(plan="enterprise", interval=None, after=after, limit=2)
+        items += page
+        if after is None:
+            break
+    assert [item["timestamp"] for item in items] == [
+        (datetime(2025, 1, 1) + timedelta(minutes=i)).isoformat() for i in range(0, 200, 50)
+    ]
+    assert all([plan["name"] for plan in item["plans"]] == ["Enterprise"] for item in items)
@@ -0,0 +1,75 @@
+import hashlib
+import io
+
+from http_client import read_body
+
+
+class FakeResponse:
+    """Streamed response yielding the given chunks"""
+
+    url = "https://example.com/pricing"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_reads_whole_body():
+    chunks = [b"<html>", b"<p>Pro $40/month</p>", b"</html>"]
+    response = FakeResponse(chunks)
+    body = read_body(response, max_bytes=1024)
+    assert body.content == b"".join(chunks)
+    assert body.size == len(b"".join(chunks))
+    assert body.digest == hashlib.sha256(b"".join(chunks)).hexdigest()
+    assert not body.truncated and not body.cut_off
+    assert response.closed
+
+
+def test_truncates_at_max_bytes():
+    response = FakeResponse([b"a" * 10, b"b" * 10, b"c" * 10])
+    body = read_body(response, max_bytes=15)
+    assert body.content == b"a" * 10 + b"b" * 5
+    assert body.size == 15
+    assert body.truncated
+    assert body.digest == hashlib.sha256(b"a" * 10 + b"b" * 5).hexdigest()
+    assert response.read == 2
+    assert response.closed
+
+
+def test_stops_after_chunk_with_cutoff_marker():
+    response = FakeResponse([b"<p>plans</p>", b"<foot", b"er>links", b"more", b"rest"])
+    body = read_body(response, cutoff=b"<footer")
+    assert body.cut_off
+    assert body.content == b"<p>plans</p><footer>links"
+    assert response.read == 3
+    assert response.closed
+
+
+def test_decodes_characters_split_across_chunks():
+    raw = "Från 49 kr/månad".encode("utf-8")
+    split = raw.index("å".encode("utf-8")) + 1
+    body = read_body(FakeResponse([raw[:split], raw[split:]]), encoding="utf-8")
+    assert body.content == "Från 49 kr/månad"
+    assert body.encoding == "utf-8"
+
+
+def test_declared_charset_is_sniffed():
+    raw = '<meta charset="utf-8"><p>3 950 kr/år</p>'.encode("utf-8")
+    body = read_body(FakeResponse([raw]))
+    assert body.content == raw.decode("utf-8")
+
+
+def test_sink_receives_raw_bytes():
+    sink = io.BytesIO()
+    chunks = [b"abc", b"def", b"ghi"]
+    read_body(FakeResponse(chunks), max_bytes=7, sink=sink)
+    assert sink.getvalue() == b"abcdefg"
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from jobs import RefreshJobQueue
+from storage import PricingStore
+
+
+class FakeScraper:
+    """Scraper whose refreshes wait for release, then succeed for every key but 'broken'"""
+
+    def __init__(self, store):
+        self.store = store
+        self.competitors = {"bolago": {}, "ledgy": {}, "broken": {}}
+        self.release = threading.Event()
+        self.runs = []
+
+    def scrape_all(self, keys, progress):
+        self.runs.append(keys)
+        if not self.release.wait(5):
+            raise RuntimeError("never released")
+        if keys == ["fail"]:
+            raise RuntimeError("scrape exploded")
+        results = {}
+        for key in keys:
+            progress(key, "running", None)
+            result = {"success": key != "broken", "error": "HTTP 500" if key == "broken" else None}
+            progress(key, "success" if result["success"] else "failed", result)
+            results[key] = result
+        return results
+
+
+@pytest.fixture
+def scraper(tmp_path):
+    return FakeScraper(PricingStore(database_url=f"sqlite:///{tmp_path}/jobs.db"))
+
+
+def wait_for(queue, job_id, status):
+    """Job status once it reached status (and, when done, its finish time)"""
+    def reached(job):
+        return job["status"] == status and (status == "running" or job["finished"] is not None)
+
+    deadline = time.monotonic() + 5
+    while not reached(queue.get(job_id)):
+        assert time.monotonic() < deadline, queue.get(job_id)
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_job_runs_in_the_background_and_reports_progress(scraper):
+    queue = RefreshJobQueue(scraper)
+    job_id = queue.submit()
+    job = wait_for(queue, job_id, "running")
+    assert job["competitors"]["bolago"]["state"] == "queued"
+
+    scraper.release.set()
+    job = wait_for(queue, job_id, "finished")
+    assert job["success_count"] == 2 and job["total"] == 3
+    assert job["competitors"]["broken"] == {"state": "failed", "error": "HTTP 500"}
+    assert job["competitors"]["ledgy"] == {"state": "success", "error": None}
+
+
+def test_identical_pending_refresh_is_shared(scraper):
+    queue = RefreshJobQueue(scraper)
+    job_id = queue.submit(["bolago"])
+    assert queue.submit(["bolago"]) == job_id
+    assert queue.submit(["ledgy"]) != job_id
+    scraper.release.set()
+    wait_for(queue, job_id, "finished")
+    # Finished jobs are not reused
+    assert queue.submit(["bolago"]) != job_id
+
+
+def test_other_workers_read_the_job_from_the_store(scraper):
+    queue = RefreshJobQueue(scraper)
+    other_worker = RefreshJobQueue(FakeScraper(scraper.store))
+    job_id = queue.submit(["ledgy"])
+    scraper.release.set()
+    wait_for(queue, job_id, "finished")
+    job = other_worker.get(job_id)
+    assert job["status"] == "finished"
+    assert job["competitors"]["ledgy"]["state"] == "success"
+    assert other_worker.get("unknown") is None
+
+
+def test_failed_refresh_is_reported(scraper):
+    queue = RefreshJobQueue(scraper)
+    scraper.release.set()
+    job = wait_for(queue, queue.submit(["fail"]), "failed")
+    assert job["error"] == "scrape exploded"
+    assert job["finished"] is not None
@@ -0,0 +1,129 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import leases
+from leases import LeaseTimeout, RefreshLeases
+from models import PricingData
+
+
+@pytest.fixture(params=["flock", "local"])
+def lease_set(request, tmp_path, monkeypatch):
+    if request.param == "local":
+        monkeypatch.setattr(leases, "fcntl", None)
+    elif leases.fcntl is None:
+        pytest.skip("flock is not available")
+    return RefreshLeases(str(tmp_path), timeout=5, poll_interval=0.01)
+
+
+def hold_in_thread(lease_set, key, release, result=None):
+    held = threading.Event()
+
+    def run():
+        with lease_set.hold(key) as lease:
+            held.set()
+            release.wait(5)
+            if result is not None:
+                lease.publish(result)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert held.wait(5)
+    return thread
+
+
+def test_waiting_holder_gets_the_published_result(lease_set):
+    release = threading.Event()
+    thread = hold_in_thread(lease_set, "bolago", release, {"success": True, "plans": ["Pro"]})
+    threading.Timer(0.1, release.set).start()
+    with lease_set.hold("bolago") as lease:
+        assert lease.waited
+        assert lease.result == {"success": True, "plans": ["Pro"]}
+    thread.join()
+
+
+def test_uncontended_holder_gets_no_result(lease_set):
+    with lease_set.hold("bolago") as lease:
+        lease.publish({"success": True})
+    with lease_set.hold("bolago") as lease:
+        assert not lease.waited
+        assert lease.result is None
+
+
+def test_leases_are_per_key(lease_set):
+    release = threading.Event()
+    thread = hold_in_thread(lease_set, "bolago", release)
+    with lease_set.hold("ledgy") as lease:
+        assert not lease.waited
+    release.set()
+    thread.join()
+
+
+def test_waiting_times_out(lease_set):
+    lease_set.timeout = 0.1
+    release = threading.Event()
+    thread = hold_in_thread(lease_set, "bolago", release)
+    with pytest.raises(LeaseTimeout):
+        with lease_set.hold("bolago"):
+            pass
+    release.set()
+    thread.join()
+
+
+def hold_and_publish(directory, held, release):
+    with RefreshLeases(directory).hold("bolago") as lease:
+        held.set()
+        release.wait(5)
+        lease.publish({"finished": "later", "success": True})
+
+
+@pytest.mark.skipif(leases.fcntl is None, reason="flock is not available")
+def test_result_is_handed_over_between_processes(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    held, release = context.Event(), context.Event()
+    process = context.Process(target=hold_and_publish, args=(str(tmp_path), held, release))
+    process.start()
+    try:
+        assert held.wait(30)
+        threading.Timer(0.1, release.set).start()
+        with RefreshLeases(str(tmp_path), timeout=10, poll_interval=0.01).hold("bolago") as lease:
+            assert lease.waited
+            assert lease.result == {"finished": "later", "success": True}
+    finally:
+        release.set()
+        process.join(10)
+
+
+def test_concurrent_refreshes_of_one_competitor_crawl_once(tmp_path):
+    from scraper import CompetitorScraper
+
+    scraper = CompetitorScraper(registry={"example": {"name": "Example", "url": "https://example.com"}})
+    scraper.leases = RefreshLeases(str(tmp_path), timeout=5, poll_interval=0.01)
+    pricing = PricingData.from_dict({"plans": [{"name": "Pro", "price": "$40/month"}], "currency": "USD"})
+    crawls = []
+
+    def crawl(competitor_key, run_id, started):
+        crawls.append(competitor_key)
+        time.sleep(0.3)
+        return {"success": True, "data": pricing}
+
+    scraper._scrape = crawl
+    results = [None, None]
+
+    def refresh(i):
+        results[i] = scraper.scrape_single("example")
+
+    threads = [threading.Thread(target=refresh, args=(i,)) for i in range(2)]
+    threads[0].start()
+    time.sleep(0.1)
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+
+    assert crawls == ["example"]
+    assert not results[0].get("attached")
+    assert results[1]["attached"]
+    assert results[1]["success"]
+    assert [plan.name for plan in results[1]["data"].plans] == ["Pro"]
@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+from pricing import PlanTable, normalize_plans, normalize_price, parse_number
+
+
+@pytest.mark.parametrize("price, amount, currency, period, monthly", [
+    ("1,413 kr/month", 1413.0, "SEK", "month", 1413.0),
+    ("€3k/year", 3000.0, "EUR", "year", 250.0),
+    ("Från 49 kr/månad", 49.0, "SEK", "month", 49.0),
+    ("$40/month", 40.0, "USD", "month", 40.0),
+    ("3 950 kr/år", 3950.0, "SEK", "year", 329.17),
+    ("£21/month", 21.0, "GBP", "month", 21.0),
+    ("$1,200/year", 1200.0, "USD", "year", 100.0),
+    ("1.413,50 kr/mån", 1413.5, "SEK", "month", 1413.5),
+    ("0 kr/månad", 0.0, "SEK", "month", 0.0),
+])
+def test_normalize_price(price, amount, currency, period, monthly):
+    assert normalize_price(price) == {
+        "amount": amount,
+        "currency": currency,
+        "billing_period": period,
+        "monthly_amount": monthly,
+    }
+
+
+def test_normalize_price_without_amount():
+    assert normalize_price("Free")["monthly_amount"] == 0.0
+    assert normalize_price("Gratis")["amount"] == 0.0
+    custom = normalize_price("Custom quote", "SEK", "month")
+    assert custom == {"amount": None, "currency": "SEK", "billing_period": "month", "monthly_amount": None}
+
+
+def test_normalize_price_defaults():
+    # The spec's currency and period apply when the text has none
+    assert normalize_price("329", "SEK", "month") == {
+        "amount": 329.0, "currency": "SEK", "billing_period": "month", "monthly_amount": 329.0,
+    }
+
+
+@pytest.mark.parametrize("number, value", [
+    ("1,413", 1413.0), ("3 950", 3950.0), ("1.413,50", 1413.5), ("49.99", 49.99), ("750", 750.0),
+])
+def test_parse_number(number, value):
+    assert parse_number(number) == value
+
+
+def test_plan_table_select_and_cheapest():
+    from models import PricingData, Snapshot
+
+    def snapshot(currency, plans):
+        data = normalize_plans({"plans": plans, "currency": currency, "billing_period": "monthly"})
+        return Snapshot("x", "u", "2024-01-01T00:00:00", True, PricingData.from_dict(data))
+
+    table = PlanTable.from_data({
+        "a": snapshot("SEK", [{"name": "Gratis", "price": "0 kr/månad"}, {"name": "Pro", "price": "750 kr/månad"}]),
+        "b": snapshot("EUR", [{"name": "Free", "price": "Free"}, {"name": "Pro", "price": "€900/year"}]),
+        "c": snapshot("USD", [{"name": "Pro", "price": "Custom pricing"}]),
+    })
+    assert len(table) == 5
+    assert [table.row(i)["competitor"] for i in table.select(tier="pro")] == ["a", "b", "c"]
+    assert [table.row(i)["competitor"] for i in table.select(tier="pro", priced_only=True)] == ["a", "b"]
+    assert table.select(competitor="missing") == []
+    assert [table.row(i)["name"] for i in table.select(max_monthly_eur=70)] == ["Gratis", "Pro", "Free"]
+    assert math.isclose(table.row(1)["monthly_amount_eur"], 66.0)
+
+    cheapest = table.cheapest_per_tier("EUR")
+    assert cheapest["pro"]["competitor"] == "a"
+    assert cheapest["free"]["monthly_in_currency"] == 0.0
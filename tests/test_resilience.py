@@ -0,0 +1,88 @@
+import pytest
+
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        breaker.record_failure("a.com")
+        assert breaker.allow("a.com")
+    breaker.record_failure("a.com")
+    assert breaker.state("a.com") == OPEN
+    assert not breaker.allow("a.com")
+    assert breaker.allow("b.com")
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure("a.com")
+    breaker.record_failure("a.com")
+    breaker.record_success("a.com")
+    breaker.record_failure("a.com")
+    breaker.record_failure("a.com")
+    assert breaker.state("a.com") == CLOSED
+    assert breaker.states() == {"a.com": CLOSED}
+
+
+def test_lets_one_probe_through_after_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure("a.com")
+    clock[0] += 59
+    assert not breaker.allow("a.com")
+    clock[0] += 1
+    assert breaker.allow("a.com")
+    assert breaker.state("a.com") == HALF_OPEN
+    assert not breaker.allow("a.com")
+
+
+def test_failed_probe_doubles_cooldown_up_to_max(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60, max_cooldown=200)
+    breaker.record_failure("a.com")
+    for cooldown in (60, 120, 200, 200):
+        clock[0] += cooldown - 1
+        assert not breaker.allow("a.com")
+        clock[0] += 1
+        assert breaker.allow("a.com")
+        breaker.record_failure("a.com")
+        assert breaker.state("a.com") == OPEN
+
+
+def test_successful_probe_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure("a.com")
+    clock[0] += 60
+    assert breaker.allow("a.com")
+    breaker.record_success("a.com")
+    assert breaker.state("a.com") == CLOSED
+    assert breaker.states() == {}
+    assert breaker.allow("a.com")
+
+
+def test_released_probe_passes_to_next_request(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure("a.com")
+    clock[0] += 60
+    assert breaker.allow("a.com")
+    breaker.release_probe("a.com")
+    assert breaker.state("a.com") == OPEN
+    assert breaker.allow("a.com")
+    assert breaker.state("a.com") == HALF_OPEN
+    assert not breaker.allow("a.com")
+
+
+def test_release_probe_leaves_other_states_alone(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.release_probe("a.com")
+    assert breaker.state("a.com") == CLOSED
+    breaker.record_failure("a.com")
+    breaker.release_probe("a.com")
+    assert not breaker.allow("a.com")